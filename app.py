@@ -4,10 +4,12 @@ Hlavní Flask aplikace s kompletní funkcionalitou pro správu uživatelských p
 """
 
 import os
+import time
 import logging
-from flask import Flask, render_template, request, redirect, url_for, session, g, jsonify, Response, flash
+from flask import Flask, render_template, request, redirect, url_for, session, g, jsonify, Response, flash, stream_with_context
 from flask_cors import CORS
 from flask_migrate import Migrate
+from jinja2 import FileSystemBytecodeCache
 from werkzeug.utils import secure_filename
 from urllib.parse import quote
 import csv
@@ -16,18 +18,27 @@ from datetime import datetime, timedelta
 
 # Import vlastních modulů
 from config import config
+from audit import audit_log
+from batch import apply_subscription_batch
+from export import stream_export, EXPORT_FORMATS
+from instrumentation import init_instrumentation
+from logging_setup import configure_logging
+from maintenance import register_commands, precompile_templates
+from memory import STREAMING_MODE, choose_parse_mode, report_import_memory
+from metrics import init_metrics, observe_import, record_import_budget
+from payments import iter_payment_calendar, forecast_spend
+from profiling import init_profiling
+from sandbox import parse_pool, ParseError
+from serialization import stream_user_subscriptions, stream_user_sync, stream_json_array, parse_fields, decode_sync_token
 from models import db, User, Subscription, validate_subscription_data, validate_user_data
 from utils import (
     detect_category, format_service_name, calculate_category_totals, 
-    get_upcoming_payments, process_bank_statement_upload, require_json, handle_errors,
-    log_user_action, validate_file_upload, generate_export_data, get_statistics
+    get_upcoming_payments, require_json, handle_errors,
+    log_user_action, validate_file_upload, get_statistics, warm_up_parsers,
+    get_service_letter, get_category_letter,
+    get_user_statistics, get_subscription_names, delete_user_subscriptions, record_tombstones
 )
 
-# Konfigurace logování
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 def create_app(config_name=None):
@@ -41,14 +52,33 @@ def create_app(config_name=None):
     config_name = config_name or os.environ.get('FLASK_ENV', 'development')
     app.config.from_object(config[config_name])
     
+    # Logování přes frontu (JSON, korelační ID požadavku)
+    configure_logging(app)
+    
+    # Měření požadavků (počty a čas DB dotazů) a metriky pro Prometheus
+    init_instrumentation(app)
+    init_metrics(app)
+    init_profiling(app)  # Jen pokud je nastaven PROFILER_TOKEN nebo PROFILER_USERS
+    
     # Inicializace rozšíření
     db.init_app(app)
+    audit_log.init_app(app)  # Auditní záznamy zapisované na pozadí
+    parse_pool.init_app(app)  # Parsování výpisů v procesech s limity
     CORS(app)  # Povolení CORS pro API
     migrate = Migrate(app, db)  # Migrace databáze
     
     # Vytvoření adresáře pro uploady
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Zkompilované šablony se ukládají na disk - nový worker je jen načte (předvyplní je warm_up, viz gunicorn.conf.py)
+    if app.config.get('TEMPLATE_CACHE_FOLDER'):
+        template_cache = os.path.abspath(app.config['TEMPLATE_CACHE_FOLDER'])
+        os.makedirs(template_cache, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(template_cache)
+    
+    # Údržbové CLI příkazy (flask update-payments, ...)
+    register_commands(app)
+    
     # Authentication decorator
     def login_required(view):
         from functools import wraps
@@ -59,31 +89,37 @@ def create_app(config_name=None):
             return view(**kwargs)
         return wrapped_view
     
+    # Endpointy, které uživatele nepotřebují (statické soubory, healthcheck)
+    ANONYMOUS_ENDPOINTS = {'static', 'health', 'metrics'}
+    
+    def get_current_user():
+        """Return logged-in user, loading it from the database at most once per request"""
+        if '_user_loaded' not in g:
+            user_id = session.get("user_id")
+            g.user = db.session.get(User, user_id) if user_id else None
+            g._user_loaded = True
+        return g.user
+    
     # Load user before each request
     @app.before_request
     def load_logged_in_user():
-        user_id = session.get("user_id")
-        g.user = db.session.get(User, user_id) if user_id else None
+        if request.endpoint in ANONYMOUS_ENDPOINTS:
+            return
+        get_current_user()
     
     # Inject user into templates
     @app.context_processor
     def inject_user():
         try:
-            from flask import session
-            user = db.session.get(User, session.get("user_id")) if session.get("user_id") else None
+            user = get_current_user()
         except RuntimeError:
             # Working outside of request context
             user = None
         return dict(user=user)
 
-    @app.context_processor
-    def inject_icon_functions():
-        """Make icon functions available in templates"""
-        from utils import get_service_letter, get_category_letter
-        return dict(
-            get_service_letter=get_service_letter,
-            get_category_letter=get_category_letter
-        )
+    # Funkce pro ikony se registrují jednou jako globály šablon (ne context processorem při každém renderu)
+    app.add_template_global(get_service_letter)
+    app.add_template_global(get_category_letter)
     
     # Error handlers
     @app.errorhandler(404)
@@ -95,6 +131,12 @@ def create_app(config_name=None):
         db.session.rollback()
         return render_template('errors/500.html'), 500
     
+    # Healthcheck route
+    @app.route("/health")
+    def health():
+        """Lightweight healthcheck without session or database access"""
+        return jsonify({"status": "ok"}), 200
+    
     # Main dashboard route
     @app.route("/")
     def landing():
@@ -261,7 +303,17 @@ def create_app(config_name=None):
             old_start_date = subscription.start_date
             old_billing_cycle = subscription.billing_cycle
             
-            subscription.name = format_service_name(data['name'])
+            # Check for duplicate name (unique per user)
+            name = format_service_name(data['name'])
+            duplicate = Subscription.query.filter(
+                Subscription.user_id == g.user.id,
+                Subscription.name == name,
+                Subscription.id != subscription.id
+            ).first()
+            if duplicate:
+                return jsonify({"success": False, "message": "Předplatné s tímto názvem již existuje"})
+            
+            subscription.name = name
             subscription.price = float(data['price'])
             subscription.billing_cycle = "měsíčně" if data['billing_cycle'] in ["monthly", "měsíčně"] else "ročně"
             subscription.category = data['category'] or detect_category(subscription.name)
@@ -300,6 +352,7 @@ def create_app(config_name=None):
             subscription_name = subscription.name
             
             db.session.delete(subscription)
+            record_tombstones(g.user.id, [id])
             db.session.commit()
             
             log_user_action('subscription_deleted', g.user.id, {'subscription_id': id, 'name': subscription_name})
@@ -323,26 +376,29 @@ def create_app(config_name=None):
         data = request.get_json()
         ids = data.get("ids", [])
         
-        if not ids:
+        if not ids or not isinstance(ids, list):
             return jsonify({"error": "Žádná ID nebyla poskytnuta"}), 400
         
-        deleted_count = 0
-        for sub_id in ids:
-            subscription = Subscription.query.filter_by(id=sub_id, user_id=g.user.id).first()
-            if subscription:
-                db.session.delete(subscription)
-                deleted_count += 1
-        
+        try:
+            deleted_ids = delete_user_subscriptions(g.user.id, ids)
+        except (TypeError, ValueError):
+            raise ValueError("Neplatné ID předplatného")
         db.session.commit()
+        deleted_count = len(deleted_ids)
         
-        log_user_action('bulk_delete', g.user.id, {'deleted_count': deleted_count, 'ids': ids})
-        return jsonify({"message": f"Bylo smazáno {deleted_count} předplatných"}), 200
+        log_user_action('bulk_delete', g.user.id, {'deleted_count': deleted_count, 'ids': deleted_ids})
+        return jsonify({
+            "message": f"Bylo smazáno {deleted_count} předplatných",
+            "deleted_count": deleted_count,
+            "deleted_ids": deleted_ids
+        }), 200
     
     # Upload bank statement route
     @app.route("/upload", methods=["POST"])
     @login_required
     def upload_bank_statement():
         """Upload and process bank statement file"""
+        started = time.perf_counter()
         try:
             file = request.files.get("file")
             validate_file_upload(file)
@@ -351,11 +407,32 @@ def create_app(config_name=None):
             filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
             file.save(filepath)
             
-            # Process bank statement (CSV, XML, ABO, TXT)
-            subscriptions_data = process_bank_statement_upload(filepath)
-            
-            # Clean up file
-            os.remove(filepath)
+            # Paměťový rozpočet: velký soubor se čte po řádcích, nebo se odmítne dřív, než worker spadne na OOM
+            budget_mb = app.config.get('IMPORT_MEMORY_BUDGET_MB')
+            try:
+                mode = choose_parse_mode(
+                    os.path.getsize(filepath), budget_mb,
+                    app.config.get('IMPORT_PANDAS_MEMORY_FACTOR', 12),
+                    app.config.get('IMPORT_STREAMING_FALLBACK', True)
+                )
+            except ValueError as e:
+                os.remove(filepath)
+                record_import_budget('rejected')
+                logger.warning(f"Bank statement rejected: {e}")
+                observe_import('bank_statement', started, 0, status='rejected')
+                return redirect(url_for("index") + f"?flash={quote('Soubor je příliš velký na zpracování')}&type=error")
+            if mode == STREAMING_MODE:
+                record_import_budget('streaming')
+            
+            # Process bank statement (CSV, XML, ABO, TXT) - v odděleném procesu s limity
+            try:
+                subscriptions_data, import_stats = parse_pool.parse(
+                    filepath, mode, trace=app.config.get('IMPORT_MEMORY_TRACE', False)
+                )
+            finally:
+                os.remove(filepath)
+            report_import_memory(import_stats, mode, budget_mb)
+            observe_import('bank_statement', started, len(subscriptions_data))
             
             log_user_action('bank_statement_uploaded', g.user.id, {'filename': filename, 'records': len(subscriptions_data)})
             
@@ -365,8 +442,16 @@ def create_app(config_name=None):
                                  flash_message="Výpis byl úspěšně nahrán",
                                  flash_type="success")
             
+        except ParseError as e:
+            observe_import('bank_statement', started, 0, status='error')
+            if e.user_message is None:
+                # Text výjimky z parseru může obsahovat cesty nebo obsah souboru - uživateli jen obecná zpráva
+                logger.warning(f"Bank statement could not be parsed: {e}")
+            message = e.user_message or 'Soubor se nepodařilo zpracovat, zkontrolujte prosím jeho formát'
+            return redirect(url_for("index") + f"?flash={quote(message)}&type=error")
         except Exception as e:
             logger.error(f"Error uploading bank statement: {e}")
+            observe_import('bank_statement', started, 0, status='error')
             return redirect(url_for("index") + f"?flash={quote('Chyba při nahrávání souboru')}&type=error")
     
     # Confirm CSV upload route
@@ -374,6 +459,7 @@ def create_app(config_name=None):
     @login_required
     def confirm_upload():
         """Confirm and save selected subscriptions from CSV"""
+        started = time.perf_counter()
         try:
             raw_data = request.form.get("data")
             selected_indices = request.form.getlist("selected")
@@ -384,13 +470,15 @@ def create_app(config_name=None):
             subscriptions_data = json.loads(raw_data)
             saved_count = 0
             
+            # Existing names loaded once - duplicates are also checked within the import itself
+            existing_names = get_subscription_names(g.user.id)
+            
             for idx in selected_indices:
                 try:
                     sub_data = subscriptions_data[int(idx)]
                     
                     # Check for duplicates
-                    existing = Subscription.query.filter_by(user_id=g.user.id, name=sub_data["name"]).first()
-                    if existing:
+                    if sub_data["name"] in existing_names:
                         continue
                     
                     # Parse dates - handle both date objects and date strings
@@ -438,6 +526,7 @@ def create_app(config_name=None):
                     )
                     
                     db.session.add(subscription)
+                    existing_names.add(subscription.name)
                     saved_count += 1
                     
                 except (IndexError, ValueError, KeyError) as e:
@@ -445,6 +534,7 @@ def create_app(config_name=None):
                     continue
             
             db.session.commit()
+            observe_import('csv_confirm', started, saved_count)
             
             log_user_action('csv_confirmed', g.user.id, {'saved_count': saved_count})
             
@@ -464,35 +554,26 @@ def create_app(config_name=None):
     @app.route("/export")
     @login_required
     def export_csv():
-        """Export subscriptions to CSV"""
+        """Export subscriptions as CSV (default), NDJSON or Parquet (?format=)"""
+        export_format = request.args.get("format", "csv")
+        user_id = g.user.id
+        
+        def log_export(record_count):
+            log_user_action(f'{export_format}_exported', user_id, {'record_count': record_count})
+        
         try:
-            subscriptions = Subscription.query.filter_by(user_id=g.user.id).all()
-            export_data = generate_export_data(subscriptions)
-            
-            # Create CSV response
-            def generate_csv():
-                if not export_data:
-                    yield "Název,Cena,Frekvence,Kategorie,Začátek,Další platba,Poznámky,Aktivní\n"
-                    return
-                
-                # Header
-                yield ",".join(export_data[0].keys()) + "\n"
-                
-                # Data
-                for row in export_data:
-                    yield ",".join(f'"{str(value)}"' for value in row.values()) + "\n"
-            
-            log_user_action('csv_exported', g.user.id, {'record_count': len(export_data)})
-            
-            return Response(
-                generate_csv(),
-                mimetype="text/csv",
-                headers={"Content-Disposition": "attachment;filename=predplatne_export.csv"}
-            )
-            
-        except Exception as e:
-            logger.error(f"Error exporting CSV: {e}")
-            return redirect(url_for("index"))
+            stream = stream_export(user_id, export_format, on_finish=log_export)
+        except ValueError as e:
+            logger.warning(f"Export in format {export_format!r} not available: {e}")
+            return redirect(url_for("index") + f"?flash={quote('Export v tomto formátu není k dispozici')}&type=error")
+        
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        
+        return Response(
+            stream_with_context(stream),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment;filename=predplatne_export.{extension}"}
+        )
     
     # Authentication routes
     @app.route("/register", methods=["GET", "POST"])
@@ -590,7 +671,11 @@ def create_app(config_name=None):
                 delete_account = request.form.get("delete_account")
                 
                 if delete_account:
-                    # Delete user account
+                    # Smazání účtu vyžaduje potvrzení heslem
+                    if not current_password or not g.user.check_password(current_password):
+                        return redirect(url_for("profile") + f"?flash={quote('Pro smazání účtu zadejte správné heslo')}&type=error")
+                    
+                    # Předplatná smaže databáze přes ON DELETE CASCADE, nenačítají se do session
                     user_id = g.user.id
                     db.session.delete(g.user)
                     db.session.commit()
@@ -682,14 +767,15 @@ def create_app(config_name=None):
         if not raw_data:
             return redirect(url_for("index"))
 
+        started = time.perf_counter()
         saved_count = 0
+        existing_names = get_subscription_names(g.user.id)
         for item in raw_data:
             try:
                 sub = json.loads(item)
                 
                 # Check for duplicates
-                existing = Subscription.query.filter_by(user_id=g.user.id, name=sub["name"]).first()
-                if existing:
+                if sub["name"] in existing_names:
                     continue
                 
                 # Create subscription
@@ -705,6 +791,7 @@ def create_app(config_name=None):
                 )
                 
                 db.session.add(new_sub)
+                existing_names.add(new_sub.name)
                 saved_count += 1
                 
             except (json.JSONDecodeError, ValueError, KeyError) as e:
@@ -712,6 +799,7 @@ def create_app(config_name=None):
                 continue
 
         db.session.commit()
+        observe_import('auto_detect', started, saved_count)
         
         log_user_action('auto_detect_saved', g.user.id, {'saved_count': saved_count})
         
@@ -725,29 +813,156 @@ def create_app(config_name=None):
     @login_required
     @require_json
     def api_subscriptions():
-        """API endpoint for subscriptions"""
-        subscriptions = Subscription.query.filter_by(user_id=g.user.id).all()
-        return jsonify([sub.to_dict() for sub in subscriptions])
+        """
+        API endpoint for subscriptions (streamed from Core rows, without ORM objects)
+        ?fields=id,name,... vybere jen potřebná pole, ?format=columnar vrátí sloupcový tvar
+        """
+        try:
+            fields = parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        columnar = request.args.get("format") == "columnar"
+        return Response(
+            stream_with_context(stream_user_subscriptions(g.user.id, fields=fields, columnar=columnar)),
+            mimetype="application/json"
+        )
+    
+    @app.route("/api/sync")
+    @login_required
+    @require_json
+    def api_sync():
+        """
+        Delta-sync endpoint for the mobile client
+        Vrací jen předplatná změněná od tokenu a ID smazaných předplatných, plus nový token
+        """
+        try:
+            since = decode_sync_token(request.args.get("since"))
+            fields = parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return Response(
+            stream_with_context(stream_user_sync(
+                g.user.id, since,
+                retention=timedelta(days=app.config["SYNC_TOMBSTONE_RETENTION_DAYS"]),
+                fields=fields
+            )),
+            mimetype="application/json"
+        )
+    
+    @app.route("/api/subscriptions/batch", methods=["POST"])
+    @login_required
+    @require_json
+    @handle_errors
+    def api_subscriptions_batch():
+        """
+        Batch create/update/delete of subscriptions in one transaction
+        Tělo: {"create": [...], "update": [{"id": ..., ...}], "delete": [ids]}
+        Neplatné položky se přeskočí a vrátí s chybami, ostatní se zapíší
+        """
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({"error": "Tělo požadavku musí být JSON objekt"}), 400
+        
+        try:
+            results = apply_subscription_batch(g.user.id, payload, app.config["BATCH_MAX_ITEMS"])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        counts = {key: sum(1 for item in items if item["status"] == key) for key, items in results.items()}
+        log_user_action('subscriptions_batch', g.user.id, counts)
+        return jsonify({**results, "counts": counts})
     
     @app.route("/api/statistics")
     @login_required
     @require_json
     def api_statistics():
         """API endpoint for statistics"""
-        subscriptions = Subscription.query.filter_by(user_id=g.user.id).all()
-        stats = get_statistics(subscriptions)
+        stats = get_user_statistics(g.user.id)
         return jsonify(stats)
     
-    @app.route('/update-payments')
+    @app.route("/api/calendar")
+    @login_required
+    @require_json
+    def api_calendar():
+        """API endpoint streaming projected payment occurrences within date range"""
+        today = datetime.now().date()
+        try:
+            date_from = datetime.strptime(request.args["from"], "%Y-%m-%d").date() if request.args.get("from") else today
+            date_to = datetime.strptime(request.args["to"], "%Y-%m-%d").date() if request.args.get("to") else date_from + timedelta(days=365)
+        except ValueError:
+            return jsonify({"error": "Neplatný formát data, očekáváme RRRR-MM-DD"}), 400
+        
+        if date_to < date_from:
+            return jsonify({"error": "Datum 'to' musí být po datu 'from'"}), 400
+        if (date_to - date_from).days > app.config["CALENDAR_MAX_DAYS"]:
+            return jsonify({"error": "Příliš dlouhé časové období"}), 400
+        
+        subscriptions = db.session.execute(
+            db.select(
+                Subscription.id, Subscription.name, Subscription.price, Subscription.billing_cycle,
+                Subscription.category, Subscription.start_date, Subscription.next_payment
+            ).where(
+                Subscription.user_id == g.user.id,
+                Subscription.is_active.is_(True),
+                Subscription.next_payment.isnot(None),
+                Subscription.next_payment <= date_to
+            )
+        ).all()
+        
+        occurrences = (
+            {
+                "date": occurrence,
+                "subscription_id": sub.id,
+                "name": sub.name,
+                "price": sub.price,
+                "billing_cycle": sub.billing_cycle,
+                "category": sub.category
+            }
+            for occurrence, sub in iter_payment_calendar(subscriptions, date_from, date_to)
+        )
+        
+        return Response(stream_json_array(occurrences), mimetype="application/json")
+    
+    @app.route("/api/forecast")
     @login_required
-    def update_payments():
-        """Update all subscription next payment dates"""
-        from utils import update_all_next_payments
-        updated_count = update_all_next_payments()
-        return redirect(url_for('index'))
+    @require_json
+    def api_forecast():
+        """API endpoint with spend forecast and what-if cancellation simulation"""
+        try:
+            months = int(request.args.get("months", 12))
+            cancelled_ids = [int(value) for value in request.args.get("cancel", "").split(",") if value.strip()]
+        except ValueError:
+            return jsonify({"error": "Parametry 'months' a 'cancel' musí být celá čísla"}), 400
+        
+        if not 1 <= months <= app.config["FORECAST_MAX_MONTHS"]:
+            return jsonify({"error": f"Počet měsíců musí být 1 až {app.config['FORECAST_MAX_MONTHS']}"}), 400
+        
+        subscriptions = db.session.execute(
+            db.select(
+                Subscription.id, Subscription.price, Subscription.billing_cycle, Subscription.category,
+                Subscription.next_payment, Subscription.monthly_cost_minor
+            ).where(Subscription.user_id == g.user.id, Subscription.is_active.is_(True))
+        ).all()
+        
+        return jsonify(forecast_spend(subscriptions, months, cancelled_ids=cancelled_ids))
     
     return app
 
+def warm_up(app):
+    """
+    Fill per-process caches before gunicorn forks the workers (see gunicorn.conf.py)
+    Zkompilované šablony, regulární výrazy parseru a numpy pak workery sdílí (copy-on-write)
+    a první požadavky nezačínají se studenou cache
+    """
+    precompile_templates(app)
+    warm_up_parsers()
+    # numpy pro výpočty plateb; pandas potřebují jen parsovací procesy (sandbox.py)
+    import numpy  # noqa: F401
+
 # Create app instance
 app = create_app()
 
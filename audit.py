@@ -0,0 +1,164 @@
+"""
+Auditní záznamy pro aplikaci Subly
+Události se z požadavků jen vloží do omezené fronty v paměti, do tabulky audit_event
+je po dávkách zapisuje vlákno na pozadí - latence požadavku na zápisu nezávisí
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from models import db, AuditEvent
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class AuditLog:
+    """
+    Bounded in-process queue of audit events flushed by a background thread
+    Při plné frontě se událost zahodí a započítá do 'dropped', požadavek nikdy nečeká
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.engine = None
+        self.queue_size = 10000
+        self.batch_size = 500
+        self.user_agent_length = AuditEvent.user_agent.type.length
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('enqueued', 'written', 'dropped', 'failed'), 0)
+        self._reported_dropped = 0
+        self._atexit_registered = False
+
+    def init_app(self, app):
+        """Read configuration and bind the writer to the app's database engine"""
+        self.enabled = app.config.get('AUDIT_ENABLED', True)
+        self.queue_size = app.config.get('AUDIT_QUEUE_SIZE', self.queue_size)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        with app.app_context():
+            self.engine = db.engine
+        # Jeden hook na proces - create_app se v testech a CLI volá opakovaně
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+    def _ensure_worker(self):
+        """Start the writer thread lazily (again after fork - threads do not survive it)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def record(self, action, user_id=None, ip_address=None, user_agent=None, details=None):
+        """Enqueue one audit event without blocking"""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        if details is not None:
+            # Serializace hned, na vlákně požadavku: pozdější změna slovníku volajícím už záznam nezmění
+            # (neznámé typy jako text)
+            details = json.loads(json.dumps(details, default=str))
+        event = {
+            'action': action,
+            'user_id': user_id,
+            'created_at': datetime.utcnow(),
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'details': details,
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            return
+        self._count('enqueued')
+
+    def _run(self):
+        """Writer loop: block for the first event, then take whatever else is queued up to batch_size"""
+        events_queue = self._queue
+        while True:
+            event = events_queue.get()
+            stopping = event is _STOP
+            batch = [] if stopping else [event]
+            while len(batch) < self.batch_size:
+                try:
+                    event = events_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    continue
+                batch.append(event)
+
+            if batch:
+                self._write(batch)
+            self._report_drops()
+            for _ in range(len(batch) + stopping):
+                events_queue.task_done()
+            if stopping:
+                return
+
+    def _write(self, batch):
+        """Insert one batch with a single multi-row INSERT"""
+        for event in batch:
+            if event['user_agent']:
+                event['user_agent'] = event['user_agent'][:self.user_agent_length]
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(AuditEvent.__table__.insert(), batch)
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"Audit write failed, {len(batch)} events lost: {e}")
+            return
+        self._count('written', len(batch))
+
+    def _report_drops(self):
+        """Log dropped events once per flush instead of once per event"""
+        dropped = self._counters['dropped']
+        if dropped > self._reported_dropped:
+            logger.warning(f"Audit queue full, dropped {dropped - self._reported_dropped} events "
+                           f"(total {dropped})")
+            self._reported_dropped = dropped
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def stop(self, timeout=5):
+        """Flush remaining events and stop the writer thread"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Audit queue still full at shutdown, remaining events are lost")
+            return
+        self._thread.join(timeout)
+        self._pid = None
+
+    def stats(self):
+        """Counters of enqueued, written, dropped and failed events plus current queue depth"""
+        with self._lock:
+            counters = dict(self._counters)
+        counters['queued'] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return counters
+
+audit_log = AuditLog()
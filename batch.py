@@ -0,0 +1,186 @@
+"""
+Dávkové operace nad předplatnými pro JSON API aplikace Subly
+Celá dávka se nejdřív zvaliduje a pak zapíše v jedné transakci množinovými příkazy
+"""
+
+from datetime import date, datetime
+
+from models import (
+    db, Subscription, validate_subscription_data, calculate_cost_minor, generate_icon_filename
+)
+from payments import calculate_next_payments
+from utils import detect_category, format_service_name, get_subscription_names, delete_user_subscriptions
+
+# Pole, která lze zadat při vytvoření nebo změnit při úpravě
+EDITABLE_FIELDS = ('name', 'price', 'billing_cycle', 'category', 'start_date', 'next_payment', 'notes')
+
+def _parse_date(value):
+    """Parse YYYY-MM-DD string (date objects and empty values pass through)"""
+    if value is None or value == '' or isinstance(value, date):
+        return value or None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def _normalize(data):
+    """Validate and normalize one item, returning (values, errors)"""
+    if not isinstance(data, dict) or not isinstance(data.get('name', ''), str):
+        return None, ['Neplatná položka']
+
+    errors = validate_subscription_data(data)
+    values = {}
+    try:
+        values['start_date'] = _parse_date(data.get('start_date'))
+        values['next_payment'] = _parse_date(data.get('next_payment'))
+    except (TypeError, ValueError):
+        errors.append('Neplatný formát data, očekáváme RRRR-MM-DD')
+    if errors:
+        return None, errors
+
+    name = format_service_name(data['name'])
+    values.update(
+        name=name,
+        price=float(data['price']),
+        billing_cycle="měsíčně" if data['billing_cycle'] in ["monthly", "měsíčně"] else "ročně",
+        category=data.get('category') or detect_category(name),
+        notes=str(data.get('notes') or '').strip()
+    )
+    return values, []
+
+def _fill_derived(rows, recalculate):
+    """Fill next_payment (batch calculation) and cost columns for rows about to be written"""
+    pending = [row for row, flag in zip(rows, recalculate) if flag and row['start_date']]
+    next_payments = calculate_next_payments(
+        [row['start_date'] for row in pending],
+        [row['billing_cycle'] for row in pending]
+    )
+    for row, next_payment in zip(pending, next_payments):
+        row['next_payment'] = next_payment
+    for row in rows:
+        # Hromadné příkazy obcházejí ORM eventy - náklady se dopočítají tady
+        row['monthly_cost_minor'], row['yearly_cost_minor'] = calculate_cost_minor(row['price'], row['billing_cycle'])
+
+def _error(index, errors, **extra):
+    return {'index': index, 'status': 'error', 'errors': errors, **extra}
+
+def _apply_deletes(user_id, items):
+    """Delete by id with one set-based DELETE, returning per-item results"""
+    results = []
+    valid = []
+    for index, value in enumerate(items):
+        if isinstance(value, int) and not isinstance(value, bool):
+            valid.append((index, value))
+        else:
+            results.append(_error(index, ['Neplatné ID předplatného']))
+
+    deleted = set(delete_user_subscriptions(user_id, [sub_id for _, sub_id in valid]))
+    results.extend(
+        {'index': index, 'id': sub_id, 'status': 'deleted' if sub_id in deleted else 'not_found'}
+        for index, sub_id in valid
+    )
+    return sorted(results, key=lambda result: result['index'])
+
+def _apply_updates(user_id, items, names):
+    """Merge partial updates with stored rows and write them with one bulk UPDATE"""
+    ids = [item.get('id') for item in items if isinstance(item, dict)]
+    ids = [sub_id for sub_id in ids if isinstance(sub_id, int) and not isinstance(sub_id, bool)]
+    existing = {
+        row.id: row for row in db.session.execute(
+            db.select(Subscription.id, *(getattr(Subscription, field) for field in EDITABLE_FIELDS))
+            .where(Subscription.user_id == user_id, Subscription.id.in_(ids))
+        )
+    } if ids else {}
+
+    results = []
+    rows = []
+    recalculate = []
+    seen = set()
+    for index, item in enumerate(items):
+        sub_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(sub_id, int) or isinstance(sub_id, bool):
+            results.append(_error(index, ['Neplatné ID předplatného']))
+            continue
+        row = existing.get(sub_id)
+        if row is None:
+            results.append({'index': index, 'id': sub_id, 'status': 'not_found'})
+            continue
+        if sub_id in seen:
+            results.append(_error(index, ['Duplicitní ID v dávce'], id=sub_id))
+            continue
+
+        merged = {field: getattr(row, field) for field in EDITABLE_FIELDS}
+        merged.update({field: item[field] for field in EDITABLE_FIELDS if field in item})
+        values, errors = _normalize(merged)
+        if not errors and values['name'] != row.name and values['name'] in names:
+            errors = ['Předplatné s tímto názvem již existuje']
+        if errors:
+            results.append(_error(index, errors, id=sub_id))
+            continue
+
+        seen.add(sub_id)
+        names.discard(row.name)
+        names.add(values['name'])
+        values.update(id=sub_id, icon_filename=generate_icon_filename(values['name']))
+        rows.append(values)
+        recalculate.append('next_payment' not in item and (
+            values['start_date'] != row.start_date or values['billing_cycle'] != row.billing_cycle
+        ))
+        results.append({'index': index, 'id': sub_id, 'status': 'updated'})
+
+    if rows:
+        _fill_derived(rows, recalculate)
+        now = datetime.utcnow()
+        for values in rows:
+            values['updated_at'] = now
+        db.session.execute(db.update(Subscription), rows)
+    return results
+
+def _apply_creates(user_id, items, names):
+    """Insert new subscriptions with one bulk INSERT ... RETURNING"""
+    results = []
+    rows = []
+    positions = []
+    for index, item in enumerate(items):
+        values, errors = _normalize(item)
+        if not errors and values['name'] in names:
+            errors = ['Předplatné s tímto názvem již existuje']
+        if errors:
+            results.append(_error(index, errors))
+            continue
+
+        names.add(values['name'])
+        values.update(user_id=user_id, is_active=True, icon_filename=generate_icon_filename(values['name']))
+        rows.append(values)
+        positions.append(len(results))
+        results.append({'index': index, 'status': 'created'})
+
+    if rows:
+        _fill_derived(rows, [not values['next_payment'] for values in rows])
+        now = datetime.utcnow()
+        for values in rows:
+            values['created_at'] = values['updated_at'] = now
+        new_ids = db.session.execute(
+            db.insert(Subscription).returning(Subscription.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for position, new_id in zip(positions, new_ids):
+            results[position]['id'] = new_id
+    return results
+
+def apply_subscription_batch(user_id, payload, max_items):
+    """
+    Apply {"create": [...], "update": [...], "delete": [...]} in the current transaction
+    Pořadí: smazání, úpravy, vytvoření (uvolněné názvy lze v dávce znovu použít).
+    Commit provádí volající. Vrací výsledky po položkách ve stejném pořadí jako vstup.
+    """
+    creates = payload.get('create') or []
+    updates = payload.get('update') or []
+    deletes = payload.get('delete') or []
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        raise ValueError("Pole 'create', 'update' a 'delete' musí být seznamy")
+    if len(creates) + len(updates) + len(deletes) > max_items:
+        raise ValueError(f"Dávka může obsahovat nejvýše {max_items} položek")
+
+    deleted = _apply_deletes(user_id, deletes)
+    names = get_subscription_names(user_id)
+    updated = _apply_updates(user_id, updates, names)
+    created = _apply_creates(user_id, creates, names)
+
+    return {'created': created, 'updated': updated, 'deleted': deleted}
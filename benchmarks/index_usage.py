@@ -0,0 +1,127 @@
+"""
+Benchmark využití indexů pro hlavní dotazy nad tabulkou subscription
+Naplní databázi (výchozí 1M řádků), vypíše plán dotazu a změří čas
+
+Použití:
+    python benchmarks/index_usage.py [--url sqlite:///bench.db] [--rows 1000000] [--users 20000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+from models import db, User, Subscription, calculate_cost_minor
+
+BATCH_SIZE = 50000
+NAMES = ['Netflix', 'Spotify', 'Hbo Max', 'Disney+', 'Icloud', 'Dropbox', 'Chatgpt', 'Notion',
+         'Youtube Premium', 'Microsoft 365', 'Adobe', 'Tidal', 'Google One', 'Canva', 'Figma']
+CATEGORIES = ['Zábava', 'Hudba', 'Úložiště', 'AI', 'Produktivita', 'Ostatní']
+
+
+def seed(engine, rows, users):
+    """Seed users and subscriptions in batches via Core inserts"""
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    per_user = max(1, rows // users)
+    today = date.today()
+    rng = random.Random(42)
+
+    with engine.begin() as conn:
+        conn.execute(sa.insert(User), [
+            {'id': uid, 'email': f'user{uid}@bench.cz', 'password': 'x', 'is_active': True}
+            for uid in range(1, users + 1)
+        ])
+
+    batch = []
+    with engine.begin() as conn:
+        for uid in range(1, users + 1):
+            for i in range(per_user):
+                price = rng.choice([99, 169, 199, 259, 1199, 2490])
+                cycle = rng.choice(['měsíčně', 'ročně'])
+                monthly, yearly = calculate_cost_minor(price, cycle)
+                batch.append({
+                    'user_id': uid,
+                    'name': f'{NAMES[i % len(NAMES)]} {i}',
+                    'price': price,
+                    'billing_cycle': cycle,
+                    'category': rng.choice(CATEGORIES),
+                    'start_date': today - timedelta(days=rng.randint(0, 1500)),
+                    'next_payment': today + timedelta(days=rng.randint(-30, 365)),
+                    'is_active': rng.random() > 0.2,
+                    'monthly_cost_minor': monthly,
+                    'yearly_cost_minor': yearly,
+                })
+                if len(batch) >= BATCH_SIZE:
+                    conn.execute(sa.insert(Subscription), batch)
+                    batch = []
+        if batch:
+            conn.execute(sa.insert(Subscription), batch)
+        if engine.dialect.name == 'postgresql':
+            conn.exec_driver_sql('ANALYZE subscription')
+        else:
+            conn.exec_driver_sql('ANALYZE')
+    return per_user * users
+
+
+def explain(conn, statement):
+    """Return query plan lines for given statement"""
+    compiled = statement.compile(conn, compile_kwargs={'literal_binds': True})
+    if conn.dialect.name == 'postgresql':
+        rows = conn.exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {compiled}')
+        return [row[0] for row in rows]
+    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}')
+    return [row[-1] for row in rows]
+
+
+def run(engine, users, repeat):
+    """Explain and time the hot queries"""
+    today = date.today()
+    queries = {
+        'duplicate check (user_id, name)': lambda uid: sa.select(Subscription.id).where(
+            Subscription.user_id == uid, Subscription.name == 'Netflix 0').limit(1),
+        'dashboard list ordered by name': lambda uid: sa.select(Subscription).where(
+            Subscription.user_id == uid).order_by(Subscription.name),
+        'upcoming payments per user': lambda uid: sa.select(Subscription).where(
+            Subscription.user_id == uid,
+            Subscription.is_active,
+            Subscription.next_payment.between(today, today + timedelta(days=7))
+        ).order_by(Subscription.next_payment),
+    }
+    rng = random.Random(7)
+    with engine.connect() as conn:
+        for label, build in queries.items():
+            print(f'\n== {label}')
+            for line in explain(conn, build(1)):
+                print(f'   {line}')
+            started = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(build(rng.randint(1, users))).fetchall()
+            elapsed = (time.perf_counter() - started) / repeat
+            print(f'   avg {elapsed * 1000:.3f} ms over {repeat} runs')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='sqlite:///bench_indexes.db')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse already seeded database')
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.url)
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seeded = seed(engine, args.rows, args.users)
+        print(f'Seeded {seeded} subscriptions in {time.perf_counter() - started:.1f} s')
+    run(engine, args.users, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
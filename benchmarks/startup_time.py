@@ -0,0 +1,75 @@
+"""
+Benchmark startu aplikace přes python -X importtime
+Změří import modulu app (včetně create_app), vypíše nejdražší importy a skončí chybou,
+pokud je start pomalejší než rozpočet nebo se při startu načte zakázaný modul (pandas, numpy)
+
+Použití:
+    python benchmarks/startup_time.py [--module app] [--runs 5] [--budget-ms 1000] [--forbid pandas,numpy]
+"""
+
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time: self [us] | cumulative | imported package" - odsazení jména = hloubka importu
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(module):
+    """Run one fresh interpreter importing module; returns [(name, depth, self_us, cumulative_us)]"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Import of {module} failed:\n{result.stderr[-2000:]}")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--forbid', default='pandas,numpy', help='modules that must not load at startup')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [next(cumulative for name, depth, _, cumulative in imports if name == args.module and depth == 0)
+              for imports in runs]
+    median_ms = statistics.median(totals) / 1000
+
+    # Nejdražší přímé importy modulu z posledního běhu
+    direct = sorted((item for item in runs[-1] if item[1] == 1), key=lambda item: item[3], reverse=True)
+    print(f"import {args.module}: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(totals) / 1000:.0f} ms, budget {args.budget_ms:.0f} ms)")
+    for name, _, _, cumulative in direct[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = {name for imports in runs for name, _, _, _ in imports}
+    forbidden = [name for name in filter(None, args.forbid.split(',')) if name in loaded]
+
+    failed = False
+    if forbidden:
+        print(f"FAIL: loaded at startup: {', '.join(forbidden)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: startup {median_ms:.0f} ms is over budget {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,9 @@ class Config:
     # Adresář pro upload souborů
     UPLOAD_FOLDER = 'uploads'
     
+    # Cache zkompilovaných šablon Jinja (None = vypnuto), předvyplní ji warm_up v masteru gunicornu
+    TEMPLATE_CACHE_FOLDER = 'template_cache'
+    
     # Konfigurace session
     SESSION_COOKIE_SAMESITE = 'Lax'
     SESSION_COOKIE_SECURE = False  # V produkci s HTTPS nastavit na True
@@ -38,6 +41,56 @@ class Config:
     # Nastavení aplikace
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Maximální velikost souboru 16MB
     UPLOAD_EXTENSIONS = ['.csv']  # Povolené přípony souborů
+    CALENDAR_MAX_DAYS = 10 * 366  # Maximální rozsah /api/calendar (10 let)
+    FORECAST_MAX_MONTHS = 36  # Maximální horizont /api/forecast
+    SYNC_TOMBSTONE_RETENTION_DAYS = 90  # Jak dlouho se drží záznamy o smazání pro /api/sync
+    BATCH_MAX_ITEMS = 1000  # Maximální počet položek v jedné dávce /api/subscriptions/batch
+    
+    # Logování (viz logging_setup.py)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' nebo 'text'
+    LOG_QUEUE_SIZE = 10000  # Při plné frontě se záznamy zahazují
+    LOG_RATE_LIMIT = 50  # Záznamů pod ERROR za sekundu na logger
+    LOG_RATE_BURST = 200
+    LOG_SAMPLE_EVERY = 100  # Nad limit projde každý N-tý záznam
+    LOG_RATE_LIMITED_LOGGERS = ['utils']  # Jen tyto loggery (parsery výpisů) se omezují
+    
+    # Hlavička Server-Timing a časy částí požadavku v logu subly.request (db, render, statistics, ...)
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() in ['true', 'on', '1']
+    
+    # Rozpočet dotazů na požadavek, detekce N+1 a log pomalých dotazů (viz instrumentation.py)
+    QUERY_BUDGET = 50  # Nejvýše tolik SQL příkazů na požadavek (pohled může přepsat @query_budget)
+    N_PLUS_ONE_THRESHOLD = 10  # Stejný tvar dotazu opakovaný tolikrát v jednom požadavku
+    QUERY_BUDGET_STRICT = False  # Sbírat porušení pro testy - zapíná jen TestingConfig
+    SLOW_QUERY_MS = 200  # Pomalé dotazy se logují i s plánem z EXPLAIN (None = vypnuto)
+    SLOW_QUERY_EXPLAIN = True
+    
+    # Profilování požadavků pro administrátory (viz profiling.py)
+    PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')  # Hlavička X-Profile: <token> profiluje požadavek
+    PROFILER_USERS = os.environ.get('PROFILER_USERS', '')  # ID uživatelů oddělená čárkou, zpracuje profiling.init_profiling
+    PROFILER_INTERVAL_MS = 5  # Interval vzorkování zásobníku
+    PROFILES_FOLDER = 'profiles'
+    PROFILES_KEEP = 50  # Starší profily se mažou
+    
+    # Paměťový rozpočet importu výpisu (viz memory.py) - odhad = velikost souboru * IMPORT_PANDAS_MEMORY_FACTOR
+    IMPORT_MEMORY_BUDGET_MB = int(os.environ.get('IMPORT_MEMORY_BUDGET_MB') or 128)  # 0 = bez limitu
+    IMPORT_PANDAS_MEMORY_FACTOR = 12  # Naměřený nárůst RSS při pd.read_csv + zpracování vůči velikosti CSV
+    IMPORT_STREAMING_FALLBACK = True  # Nad rozpočtem číst CSV po řádcích, jinak import odmítnout
+    IMPORT_MEMORY_TRACE = os.environ.get('IMPORT_MEMORY_TRACE', 'false').lower() in ['true', 'on', '1']  # tracemalloc zhruba zdvojnásobí čas parsování
+    # Parsování v odděleném procesu (viz sandbox.py) - 0 = parsovat přímo ve web workeru
+    IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS') or 1)  # Předem spuštěné procesy na web worker (paměť viz DEPLOYMENT.md)
+    IMPORT_TIMEOUT = 30  # Sekund na jeden soubor celkem (včetně čekání na volný proces), musí být pod timeoutem gunicornu (60 s)
+    IMPORT_CPU_SECONDS = 20  # RLIMIT_CPU na jeden soubor
+    IMPORT_WORKER_MEMORY_MB = 512  # RLIMIT_AS nad velikost procesu po startu
+    
+    # Metriky /metrics - pokud je token nastaven, vyžaduje se hlavička Authorization: Bearer <token>
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_REQUIRE_TOKEN = False  # True = bez METRICS_TOKEN se /metrics nevystaví
+    
+    # Auditní záznamy (tabulka audit_event, zapisuje vlákno na pozadí)
+    AUDIT_ENABLED = True
+    AUDIT_QUEUE_SIZE = 10000  # Při plné frontě se události zahazují a počítají
+    AUDIT_BATCH_SIZE = 500  # Maximální počet událostí v jednom INSERTu
     
     # Bezpečnostní nastavení
     WTF_CSRF_ENABLED = True
@@ -46,12 +99,15 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = False  # Vypnuto pro rychlejší odezvu
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    IMPORT_MEMORY_TRACE = os.environ.get('IMPORT_MEMORY_TRACE', 'true').lower() in ['true', 'on', '1']
     SQLALCHEMY_DATABASE_URI = 'sqlite:///dev_database.db'
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    METRICS_REQUIRE_TOKEN = True
     
     def __init__(self):
         # Ensure secret key is set in production
@@ -69,6 +125,7 @@ class PostgreSQLConfig(Config):
     """PostgreSQL configuration for Railway deployment"""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    METRICS_REQUIRE_TOKEN = True
     
     def __init__(self):
         # Ensure required environment variables are set
@@ -84,6 +141,10 @@ class PostgreSQLConfig(Config):
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
+    QUERY_BUDGET_STRICT = True  # Překročení rozpočtu dotazů nebo N+1 v testech selže (tests/conftest.py)
+    IMPORT_WORKERS = 0  # Testy parsují v procesu (bez forkserveru)
+    AUDIT_ENABLED = False  # Vlákno na pozadí by sdílelo jediné spojení SQLite v paměti s požadavky testu
+    TEMPLATE_CACHE_FOLDER = None  # Testy nezapisují cache šablon do pracovního adresáře
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
 
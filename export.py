@@ -0,0 +1,152 @@
+"""
+Export předplatných pro aplikaci Subly
+Řádky se čtou po dávkách (yield_per, na PostgreSQL serverový kurzor) a zapisují průběžně,
+takže paměť nezávisí na počtu exportovaných předplatných
+"""
+
+import io
+import csv
+
+from models import db, Subscription
+from serialization import dumps
+
+EXPORT_CHUNK_SIZE = 1000
+
+# (klíč pro NDJSON/Parquet, hlavička CSV, sloupec)
+EXPORT_COLUMNS = (
+    ('name', 'Název', Subscription.name),
+    ('price', 'Cena', Subscription.price),
+    ('billing_cycle', 'Frekvence', Subscription.billing_cycle),
+    ('category', 'Kategorie', Subscription.category),
+    ('start_date', 'Začátek', Subscription.start_date),
+    ('next_payment', 'Další platba', Subscription.next_payment),
+    ('notes', 'Poznámky', Subscription.notes),
+    ('is_active', 'Aktivní', Subscription.is_active),
+)
+
+# formát -> (mimetype, přípona souboru)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+def _iter_chunks(user_id, chunk_size, on_finish=None):
+    """Yield lists of export rows fetched in yield_per batches; on_finish(row_count) runs when the stream ends"""
+    query = (
+        db.select(*(column for _, _, column in EXPORT_COLUMNS))
+        .where(Subscription.user_id == user_id)
+        .order_by(Subscription.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = db.session.connection().execute(query)
+    row_count = 0
+    try:
+        for partition in result.partitions():
+            row_count += len(partition)
+            yield partition
+    finally:
+        # Počet se zjistí průběžně při streamování - bez dalšího COUNT dotazu (i u přerušeného stahování)
+        if on_finish is not None:
+            on_finish(row_count)
+
+def _csv_row(row):
+    """Format one row the way the CSV export always looked"""
+    name, price, billing_cycle, category, start_date, next_payment, notes, is_active = row
+    return (
+        name, price, billing_cycle, category,
+        start_date.strftime('%Y-%m-%d') if start_date else '',
+        next_payment.strftime('%Y-%m-%d') if next_payment else '',
+        notes or '',
+        'Ano' if is_active else 'Ne'
+    )
+
+def _stream_csv(chunks):
+    """Write rows with the csv module (correct quoting), one buffer flush per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header, _ in EXPORT_COLUMNS])
+    for chunk in chunks:
+        writer.writerows(_csv_row(row) for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def _stream_ndjson(chunks):
+    """One JSON object per line"""
+    keys = [key for key, _, _ in EXPORT_COLUMNS]
+    for chunk in chunks:
+        yield b''.join(dumps(dict(zip(keys, row))) + b'\n' for row in chunk)
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting bytes until the stream drains them"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ('name', pa.string()),
+        ('price', pa.float64()),
+        ('billing_cycle', pa.string()),
+        ('category', pa.string()),
+        ('start_date', pa.date32()),
+        ('next_payment', pa.date32()),
+        ('notes', pa.string()),
+        ('is_active', pa.bool_()),
+    ])
+
+def _stream_parquet(chunks):
+    """Write one Parquet row group per chunk and yield the bytes as they are produced"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+def stream_export(user_id, export_format='csv', chunk_size=EXPORT_CHUNK_SIZE, on_finish=None):
+    """
+    Stream user's subscriptions in the given format as bytes
+    Parquet vyžaduje volitelný balíček pyarrow, bez něj vyhodí ValueError;
+    on_finish(row_count) se zavolá po dočtení (nebo přerušení) streamu
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Nepodporovaný formát exportu: {export_format}")
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Export do Parquetu vyžaduje balíček pyarrow")
+        return _stream_parquet(_iter_chunks(user_id, chunk_size, on_finish))
+    if export_format == 'ndjson':
+        return _stream_ndjson(_iter_chunks(user_id, chunk_size, on_finish))
+    return _stream_csv(_iter_chunks(user_id, chunk_size, on_finish))
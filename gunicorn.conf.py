@@ -0,0 +1,70 @@
+"""
+Konfigurace gunicornu pro aplikaci Subly
+Aplikace se načte jednou v masteru (preload_app), zahřeje cache a workery se z ní forkují -
+sdílí tak paměť (copy-on-write) a startují okamžitě. Spojení do databáze se po forku
+nesdílí: každý worker zahodí pool zděděný z masteru (post_fork)
+
+Spuštění: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '2000')}"
+
+# gthread: vlákna čekají na DB a I/O, procesy škálují CPU. Počet CPU v kontejneru často
+# odpovídá celému hostiteli, proto strop - přesný počet jde nastavit přes WEB_CONCURRENCY
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+
+preload_app = True
+
+# Import výpisu může trvat až IMPORT_TIMEOUT (30 s včetně čekání na volný parsovací proces)
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# Průběžná obměna workerů omezí růst paměti (fragmentace, cache), jitter brání restartu všech naráz
+max_requests = 1000
+max_requests_jitter = 100
+
+# Heartbeat workerů v tmpfs - v kontejneru může být /tmp na pomalém overlay disku
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = None  # Požadavky loguje aplikace (subly.request, JSON)
+errorlog = '-'
+
+
+def when_ready(server):
+    """Warm the preloaded app's caches in the master, before the workers are forked"""
+    from app import app, warm_up
+    warm_up(app)
+    server.log.info("Application caches warmed up")
+
+
+def post_fork(server, worker):
+    """
+    Drop database connections inherited from the master - a pooled connection must not cross fork -
+    and start the worker's parse pool before it takes requests
+    """
+    from app import app
+    from models import db
+    from sandbox import parse_pool
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: spojení patří masteru, worker je jen zapomene a otevře si vlastní
+            engine.dispose(close=False)
+    # Forkserver s pandas (~1 s) se spustí hned, ne až při prvním nahraném výpisu
+    parse_pool.start()
+
+
+def child_exit(server, worker):
+    """Remove the exited worker's live gauge files from the shared metrics directory"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
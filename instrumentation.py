@@ -0,0 +1,260 @@
+"""
+Měření požadavků pro aplikaci Subly
+SQLAlchemy eventy sčítají počet a čas databázových dotazů do statistik aktuálního požadavku,
+volitelné časovače (SERVER_TIMING_ENABLED) měří vybrané funkce a renderování šablon
+a posílají souhrn v hlavičce Server-Timing. Hlídá také rozpočet dotazů na požadavek,
+opakované stejné dotazy (N+1) a loguje pomalé dotazy i s plánem z EXPLAIN
+"""
+
+import time
+import logging
+from collections import deque
+from functools import wraps
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+request_logger = logging.getLogger('subly.request')
+sql_logger = logging.getLogger('subly.sql')
+
+# Zapnuto přes SERVER_TIMING_ENABLED; vypnuté časovače jen zavolají původní funkci
+_timing_enabled = False
+
+# Práh pomalého dotazu v sekundách (None = vypnuto) a zda k němu přiložit EXPLAIN
+_slow_query_seconds = None
+_explain_slow_queries = False
+# Stejný dotaz se EXPLAINuje nejvýše jednou za tento interval (sekundy)
+EXPLAIN_INTERVAL = 600
+_explained = {}
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+# Strop nasbíraných porušení - seznam nesmí růst bez omezení, když ho nikdo nevybírá
+MAX_COLLECTED_VIOLATIONS = 100
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised by the test suite for budget or N+1 violations collected in strict mode"""
+
+class RequestStats:
+    """Per-request counters filled by the instrumentation hooks"""
+    __slots__ = ('started', 'db_queries', 'db_time', 'timings', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+        # Text dotazu (s placeholdery, tedy "tvar") -> počet provedení
+        self.statements = {}
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add_timing(self, name, duration):
+        """Add duration (seconds) to the named timer"""
+        total, count = self.timings.get(name, (0.0, 0))
+        self.timings[name] = (total + duration, count + 1)
+
+def current_stats():
+    """Stats of the current request (None outside a request)"""
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += duration
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if _slow_query_seconds is not None and duration >= _slow_query_seconds:
+        _log_slow_query(conn, statement, parameters, executemany, duration)
+
+def _explain(conn, statement, parameters):
+    """Query plan of a SELECT via a raw DBAPI cursor (bypasses the engine events)"""
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    postgresql = conn.dialect.name == 'postgresql'
+    cursor = conn.connection.cursor()
+    try:
+        # Chyba uvnitř transakce by ji na PostgreSQL shodila - EXPLAIN běží v savepointu
+        if postgresql:
+            cursor.execute('SAVEPOINT subly_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        finally:
+            if postgresql:
+                cursor.execute('ROLLBACK TO SAVEPOINT subly_explain')
+                cursor.execute('RELEASE SAVEPOINT subly_explain')
+        return plan
+    finally:
+        cursor.close()
+
+def _log_slow_query(conn, statement, parameters, executemany, duration):
+    plan = None
+    now = time.monotonic()
+    if _explain_slow_queries and not executemany and now - _explained.get(statement, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL:
+        _explained[statement] = now
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+    sql_logger.warning(
+        "Slow query (%.1f ms): %s", duration * 1000, statement,
+        extra={'duration_ms': round(duration * 1000, 1), 'plan': plan}
+    )
+
+def _handle_error(exception_context):
+    # Neúspěšný dotaz nevyvolá after_cursor_execute - uvolni jeho začátek ze zásobníku
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+def timed(name):
+    """Decorator adding the function's run time to the request timer 'name'"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _timing_enabled:
+                return func(*args, **kwargs)
+            stats = current_stats()
+            if stats is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add_timing(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def _render_started(sender, template, context, **extra):
+    g.setdefault('render_started', []).append(time.perf_counter())
+
+def _render_finished(sender, template, context, **extra):
+    stats = current_stats()
+    started = g.get('render_started')
+    if stats is not None and started:
+        stats.add_timing('render', time.perf_counter() - started.pop())
+
+def server_timing_header(stats):
+    """Format request stats as a Server-Timing header value (durations in ms)"""
+    entries = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries"']
+    for name, (duration, count) in stats.timings.items():
+        entries.append(f'{name};dur={duration * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else ''))
+    entries.append(f'total;dur={stats.elapsed * 1000:.1f}')
+    return ', '.join(entries)
+
+def _add_server_timing(response):
+    stats = current_stats()
+    if stats is not None:
+        response.headers['Server-Timing'] = server_timing_header(stats)
+    return response
+
+def _log_request(response):
+    # Jediný záznam o požadavku (gunicorn má access log vypnutý) - loguje se vždy, časovače jen se SERVER_TIMING_ENABLED
+    stats = current_stats()
+    if stats is None:
+        return response
+    request_logger.info(
+        "%s %s %s %.1fms", request.method, request.path, response.status_code, stats.elapsed * 1000,
+        extra={
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(stats.elapsed * 1000, 1),
+            'db_queries': stats.db_queries,
+            'db_ms': round(stats.db_time * 1000, 1),
+            'timings_ms': {name: round(duration * 1000, 1) for name, (duration, _) in stats.timings.items()},
+        }
+    )
+    return response
+
+def query_budget(limit):
+    """Override the QUERY_BUDGET for one view"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+def _check_query_budget(app, stats):
+    """
+    Report requests over budget and repeated identical statements
+    Ve striktním režimu (TestingConfig) se porušení navíc sbírají pro pop_query_budget_violations,
+    fixture app v tests/conftest.py s nimi test shodí
+    """
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', app.config.get('QUERY_BUDGET'))
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD')
+
+    problems = []
+    if budget is not None and stats.db_queries > budget:
+        problems.append(f"{stats.db_queries} queries (budget {budget})")
+    repeated = {}
+    if threshold:
+        repeated = {statement: count for statement, count in stats.statements.items() if count >= threshold}
+        problems.extend(f"statement repeated {count}x (possible N+1): {statement[:200]}"
+                        for statement, count in repeated.items())
+    if not problems:
+        return
+
+    message = f"{request.method} {request.path}: " + '; '.join(problems)
+    if app.config.get('QUERY_BUDGET_STRICT'):
+        app.extensions.setdefault('query_budget_violations', deque(maxlen=MAX_COLLECTED_VIOLATIONS)).append(message)
+    sql_logger.warning(message, extra={
+        'endpoint': request.endpoint,
+        'db_queries': stats.db_queries,
+        'budget': budget,
+        'repeated': [{'statement': statement, 'count': count} for statement, count in repeated.items()],
+    })
+
+def pop_query_budget_violations(app):
+    """Return and clear the violations collected in strict mode (QUERY_BUDGET_STRICT)"""
+    return list(app.extensions.pop('query_budget_violations', ()))
+
+_listeners_installed = False
+
+def init_instrumentation(app):
+    """
+    Install engine listeners (once per process), start request stats and log every request
+    S SERVER_TIMING_ENABLED zapne časovače, měření šablon a hlavičku Server-Timing
+    """
+    global _listeners_installed, _timing_enabled, _slow_query_seconds, _explain_slow_queries
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listeners_installed = True
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    app.after_request(_log_request)
+
+    @app.teardown_request
+    def enforce_query_budget(exception=None):
+        # Teardown běží až po odeslání celého těla - dotazy ze stream_with_context generátorů se započítají
+        stats = current_stats()
+        if stats is not None:
+            _check_query_budget(app, stats)
+
+    if app.config.get('SLOW_QUERY_MS') is not None:
+        _slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+        _explain_slow_queries = app.config.get('SLOW_QUERY_EXPLAIN', True)
+
+    if app.config.get('SERVER_TIMING_ENABLED'):
+        _timing_enabled = True
+        before_render_template.connect(_render_started, app)
+        template_rendered.connect(_render_finished, app)
+        app.after_request(_add_server_timing)
@@ -0,0 +1,208 @@
+"""
+Konfigurace logování pro aplikaci Subly
+Záznamy jdou přes QueueHandler do omezené fronty, formátování do JSON a zápis na výstup
+dělá vlákno QueueListeneru - požadavek ani smyčka importu na I/O logování nečeká
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+
+from flask import g, request, has_request_context
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Atributy LogRecordu, které nejsou vlastními poli (extra=...)
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request's correlation id (runs in the logging thread of the caller)"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-logger token bucket for records below ERROR, attached to the noisy parser loggers
+    Nad limit propustí jen každý N-tý záznam (sampling) a počet potlačených připíše k dalšímu
+    propuštěnému záznamu; ERROR a vyšší projdou vždy
+    """
+
+    def __init__(self, rate, burst, sample_every):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample_every = sample_every
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR or not self.rate:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                # [tokeny, čas posledního doplnění, potlačeno, přes limit celkem]
+                bucket = self._buckets[record.name] = [self.burst, now, 0, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+            else:
+                bucket[3] += 1
+                if not self.sample_every or bucket[3] % self.sample_every:
+                    bucket[2] += 1
+                    return False
+                record.sampled = self.sample_every
+
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message, request id and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """Plain text format for local development"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id') or record.request_id is None:
+            record.request_id = '-'
+        return super().format(record)
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of blocking or raising
+    Po forku (gunicorn preload) znovu spustí listener, protože vlákna fork nepřežijí
+    """
+
+    def __init__(self, log_queue, target):
+        super().__init__(log_queue)
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start (or restart after fork) the listener thread writing to the target handler"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Fronta zděděná z rodiče může obsahovat záznamy i zamčené zámky
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records and stop the listener"""
+        if self._pid == os.getpid() and self._listener is not None:
+            self._listener.stop()
+            self._pid = None
+
+    def prepare(self, record):
+        # Formátování zprávy proběhne tady (hodnoty argumentů se mohou změnit),
+        # JSON a traceback až v listeneru
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_handler = None
+
+def configure_logging(app):
+    """
+    Install the queue-based logging pipeline on the root logger (once per process)
+    a zaregistruje generování korelačního ID požadavku
+    """
+    global _handler
+    level = app.config.get('LOG_LEVEL', 'INFO')
+
+    if _handler is None:
+        target = logging.StreamHandler(sys.stdout)
+        target.setFormatter(JsonFormatter() if app.config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter())
+
+        _handler = BoundedQueueHandler(queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000)), target)
+        _handler.addFilter(RequestIdFilter())
+
+        # Omezení jen pro hlučné loggery (varování po řádcích v parserech) - logy požadavků,
+        # SQL, importů a údržby musí projít celé
+        rate_limit = RateLimitFilter(
+            rate=app.config.get('LOG_RATE_LIMIT', 50),
+            burst=app.config.get('LOG_RATE_BURST', 200),
+            sample_every=app.config.get('LOG_SAMPLE_EVERY', 100)
+        )
+        for name in app.config.get('LOG_RATE_LIMITED_LOGGERS', ('utils',)):
+            logging.getLogger(name).addFilter(rate_limit)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+        _handler.start()
+        atexit.register(_handler.stop)
+
+    logging.getLogger().setLevel(level)
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+
+    @app.after_request
+    def expose_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+def dropped_log_records():
+    """Number of log records dropped because the queue was full"""
+    return _handler.dropped if _handler is not None else 0
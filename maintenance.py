@@ -0,0 +1,212 @@
+"""
+Údržbové úlohy pro aplikaci Subly
+Obsahuje Flask CLI příkazy spouštěné plánovačem (cron, Railway cron job)
+"""
+
+import time
+import zlib
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import select, update, delete, text
+
+from models import db, User, Subscription, SubscriptionTombstone
+from payments import calculate_next_payments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+def _advisory_lock_key(name):
+    """Stable 32-bit key for PostgreSQL advisory locks"""
+    return zlib.crc32(f"subly:{name}".encode('utf-8'))
+
+@contextmanager
+def advisory_lock(name):
+    """
+    Cluster-wide lock so that a job runs on one node only
+    Na PostgreSQL používá pg_try_advisory_lock, jinde (SQLite) zámek vždy získá
+    """
+    engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        yield True
+        return
+
+    key = _advisory_lock_key(name)
+    # AUTOCOMMIT: zámek je na úrovni session, spojení nesmí zůstat "idle in transaction" po celou dobu úlohy
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': key}).scalar()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': key})
+
+def update_overdue_next_payments(chunk_size=DEFAULT_CHUNK_SIZE, today=None, progress=None):
+    """
+    Recalculate next_payment for rows whose next_payment is in the past
+    Rows are read in keyset-paginated chunks and written with one bulk UPDATE per chunk
+    """
+    today = today or date.today()
+    processed = 0
+    updated = 0
+    last_id = 0
+
+    while True:
+        rows = db.session.execute(
+            select(Subscription.id, Subscription.start_date, Subscription.billing_cycle)
+            .where(
+                Subscription.next_payment < today,
+                Subscription.start_date.isnot(None),
+                Subscription.id > last_id
+            )
+            .order_by(Subscription.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        now = datetime.utcnow()
+        next_payments = calculate_next_payments(
+            [row.start_date for row in rows],
+            [row.billing_cycle for row in rows],
+            today=today
+        )
+        changes = [
+            {'id': row.id, 'next_payment': next_payment, 'updated_at': now}
+            for row, next_payment in zip(rows, next_payments)
+            if next_payment
+        ]
+
+        if changes:
+            db.session.execute(update(Subscription), changes)
+        db.session.commit()
+
+        processed += len(rows)
+        updated += len(changes)
+        last_id = rows[-1].id
+        if progress:
+            progress(processed, updated)
+
+    return processed, updated
+
+def purge_inactive_users(chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Delete inactive users in chunks without loading them into the ORM
+    Jejich předplatná smaže databáze přes ON DELETE CASCADE
+    """
+    deleted = 0
+
+    while True:
+        ids = db.session.execute(
+            select(User.id).where(User.is_active.is_(False)).order_by(User.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.session.execute(
+            delete(User).where(User.id.in_(ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+        deleted += len(ids)
+        if progress:
+            progress(deleted)
+
+    return deleted
+
+def prune_tombstones(retention_days):
+    """Delete deletion-log entries older than the sync retention window"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(
+        delete(SubscriptionTombstone).where(SubscriptionTombstone.deleted_at < cutoff),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount
+
+def precompile_templates(app):
+    """
+    Compile every template of the app so that its bytecode lands in the Jinja bytecode cache
+    Chyba syntaxe v šabloně se tak projeví při buildu, ne při prvním požadavku
+    """
+    env = app.jinja_env
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+def register_commands(app):
+    """Register maintenance CLI commands on the Flask app"""
+
+    @app.cli.command('update-payments')
+    @click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+                  help='Počet řádků zpracovaných v jedné dávce')
+    def update_payments_command(chunk_size):
+        """Přepočítá data dalších plateb, která už jsou v minulosti"""
+        started = time.perf_counter()
+
+        with advisory_lock('update-payments') as acquired:
+            if not acquired:
+                click.echo("Úloha už běží na jiném uzlu, přeskakuji")
+                return
+
+            def report(processed, updated):
+                click.echo(f"  zpracováno {processed} řádků, aktualizováno {updated} "
+                           f"({time.perf_counter() - started:.2f} s)")
+
+            processed, updated = update_overdue_next_payments(chunk_size=chunk_size, progress=report)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"update-payments: processed={processed} updated={updated} elapsed={elapsed:.3f}s")
+        click.echo(f"Hotovo: aktualizováno {updated} z {processed} předplatných za {elapsed:.2f} s")
+
+    @app.cli.command('purge-inactive-users')
+    @click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+                  help='Počet uživatelů smazaných v jedné dávce')
+    @click.option('--dry-run', is_flag=True, help='Pouze vypíše počet neaktivních uživatelů')
+    def purge_inactive_users_command(chunk_size, dry_run):
+        """Smaže neaktivní uživatele včetně jejich předplatných"""
+        if dry_run:
+            count = db.session.execute(
+                select(db.func.count(User.id)).where(User.is_active.is_(False))
+            ).scalar()
+            click.echo(f"Neaktivních uživatelů ke smazání: {count}")
+            return
+
+        started = time.perf_counter()
+
+        with advisory_lock('purge-inactive-users') as acquired:
+            if not acquired:
+                click.echo("Úloha už běží na jiném uzlu, přeskakuji")
+                return
+
+            def report(deleted):
+                click.echo(f"  smazáno {deleted} uživatelů ({time.perf_counter() - started:.2f} s)")
+
+            deleted = purge_inactive_users(chunk_size=chunk_size, progress=report)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"purge-inactive-users: deleted={deleted} elapsed={elapsed:.3f}s")
+        click.echo(f"Hotovo: smazáno {deleted} neaktivních uživatelů za {elapsed:.2f} s")
+
+    @app.cli.command('compile-templates')
+    def compile_templates_command():
+        """Předkompiluje všechny šablony do cache (TEMPLATE_CACHE_FOLDER)"""
+        started = time.perf_counter()
+        count = precompile_templates(app)
+        elapsed = time.perf_counter() - started
+        if app.jinja_env.bytecode_cache is None:
+            click.echo("TEMPLATE_CACHE_FOLDER není nastaven - šablony jsou jen zkontrolované, cache se nezapisuje")
+        click.echo(f"Hotovo: zkompilováno {count} šablon za {elapsed:.2f} s")
+
+    @app.cli.command('prune-tombstones')
+    def prune_tombstones_command():
+        """Smaže záznamy o smazaných předplatných starší než retence synchronizace"""
+        retention_days = app.config['SYNC_TOMBSTONE_RETENTION_DAYS']
+        deleted = prune_tombstones(retention_days)
+        logger.info(f"prune-tombstones: deleted={deleted} retention_days={retention_days}")
+        click.echo(f"Hotovo: smazáno {deleted} záznamů starších než {retention_days} dní")
@@ -0,0 +1,149 @@
+"""
+Měření paměti importů pro aplikaci Subly
+Před parsováním odhadne paměť podle velikosti souboru a zvolí režim (pandas / streamovaný),
+během parsování vzorkuje RSS procesu a volitelně sleduje alokace přes tracemalloc
+"""
+
+import os
+import logging
+import threading
+import tracemalloc
+
+from metrics import observe_import_memory, record_import_budget
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+RSS_SAMPLE_INTERVAL = 0.01
+
+# Režimy parsování CSV
+PANDAS_MODE = 'pandas'
+STREAMING_MODE = 'streaming'
+
+def current_rss():
+    """Resident set size of this process in bytes (None where /proc is not available)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def choose_parse_mode(file_size, budget_mb, pandas_factor, streaming_fallback=True):
+    """
+    Pick the parse mode for a file of file_size bytes within budget_mb
+    Pandas potřebuje zhruba pandas_factor násobek velikosti souboru; když se to do rozpočtu
+    nevejde, použije se streamované čtení po řádcích, nebo se import odmítne
+    """
+    if not budget_mb or file_size * pandas_factor <= budget_mb * MB:
+        return PANDAS_MODE
+    if streaming_fallback:
+        return STREAMING_MODE
+    raise ValueError(f"Soubor je na import příliš velký (odhad {file_size * pandas_factor // MB} MB, "
+                     f"limit {budget_mb} MB)")
+
+# tracemalloc je globální pro proces - souběžné importy ho sdílí přes počítadlo
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+
+def _stop_tracing():
+    """Return traced peak (bytes) and a snapshot, stopping tracemalloc when no import needs it"""
+    global _tracing_users
+    with _tracing_lock:
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+    return peak, snapshot
+
+class MemoryMonitor:
+    """
+    Context manager measuring peak memory of one import
+    peak_rss: nárůst RSS nad stav před importem (vzorkováno vláknem),
+    peak_traced: špička alokací Pythonu/NumPy podle tracemalloc (jen s trace=True)
+    """
+
+    def __init__(self, trace=False, interval=RSS_SAMPLE_INTERVAL):
+        self.trace = trace
+        self.interval = interval
+        self.baseline_rss = None
+        self.peak_rss = None
+        self.peak_traced = None
+        self.snapshot = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.baseline_rss = current_rss()
+        if self.baseline_rss is not None:
+            self.peak_rss = 0
+            self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+            self._thread.start()
+        if self.trace:
+            _start_tracing()
+        return self
+
+    def _sample(self):
+        while True:
+            rss = current_rss()
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss - self.baseline_rss)
+            if self._stop.wait(self.interval):
+                return
+
+    def __exit__(self, *exc_info):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        if self.trace:
+            self.peak_traced, self.snapshot = _stop_tracing()
+        return False
+
+    @property
+    def peak(self):
+        """Best available peak estimate in bytes"""
+        return max(self.peak_rss or 0, self.peak_traced or 0)
+
+    def top_allocations(self, limit=5):
+        """Largest allocation sites still alive when the import finished, as 'file:line size' strings"""
+        if self.snapshot is None:
+            return []
+        stats = self.snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        )).statistics('lineno')
+        return [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size // 1024} KiB"
+                for stat in stats[:limit]]
+
+def report_import_memory(stats, mode, budget_mb):
+    """
+    Log and export peak memory of a finished import (stats from sandbox.parse_statement)
+    Nad rozpočtem se k záznamu přidají místa s největšími alokacemi
+    """
+    peak_rss, peak_traced = stats.get('peak_rss'), stats.get('peak_traced')
+    peak = max(peak_rss or 0, peak_traced or 0)
+    observe_import_memory(stats.get('parser'), mode, peak_rss, peak_traced)
+    over_budget = bool(budget_mb) and peak > budget_mb * MB
+    if over_budget:
+        record_import_budget('exceeded')
+    logger.log(
+        logging.WARNING if over_budget else logging.INFO,
+        "Import memory: parser=%s mode=%s rows=%s peak=%.1f MB", stats.get('parser'), mode, stats.get('rows'), peak / MB,
+        extra={
+            'parser': stats.get('parser'),
+            'mode': mode,
+            'rows': stats.get('rows'),
+            'peak_rss_bytes': peak_rss,
+            'peak_traced_bytes': peak_traced,
+            'budget_mb': budget_mb,
+            'retained_allocations': stats.get('retained_allocations') if over_budget else None,
+        }
+    )
@@ -0,0 +1,146 @@
+"""
+Metriky ve formátu Prometheus pro aplikaci Subly
+Workery gunicornu sdílí hodnoty přes multiprocess režim prometheus_client (adresář
+v PROMETHEUS_MULTIPROC_DIR); bez balíčku prometheus_client se metriky nesbírají
+"""
+
+import os
+import time
+import hmac
+
+from flask import request, Response, abort
+
+from instrumentation import current_stats
+
+try:
+    from prometheus_client import (
+        Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+    )
+except ImportError:  # prometheus_client je volitelný, bez něj se metriky nesbírají
+    Counter = None
+
+# Endpointy, které se do metrik požadavků nepočítají
+EXCLUDED_ENDPOINTS = {'metrics', 'static'}
+
+DB_QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+IMPORT_ROW_BUCKETS = (0, 10, 100, 1000, 10000, 50000, 100000)
+IMPORT_MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 32, 64, 128, 256, 512, 1024))
+
+if Counter is not None:
+    REQUESTS = Counter(
+        'subly_http_requests_total', 'HTTP requests by endpoint, method and status',
+        ['endpoint', 'method', 'status']
+    )
+    REQUEST_LATENCY = Histogram(
+        'subly_http_request_duration_seconds', 'Time to produce the response by endpoint',
+        ['endpoint', 'method']
+    )
+    DB_QUERIES = Histogram(
+        'subly_db_queries_per_request', 'Database statements executed per request',
+        ['endpoint'], buckets=DB_QUERY_BUCKETS
+    )
+    DB_TIME = Histogram(
+        'subly_db_time_per_request_seconds', 'Time spent in database statements per request',
+        ['endpoint']
+    )
+    IMPORT_DURATION = Histogram(
+        'subly_import_duration_seconds', 'Duration of import jobs (statement parsing, confirmed imports)',
+        ['source', 'status'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    )
+    IMPORT_ROWS = Histogram(
+        'subly_import_rows', 'Rows produced or saved by one import job',
+        ['source'], buckets=IMPORT_ROW_BUCKETS
+    )
+    IMPORT_PEAK_MEMORY = Histogram(
+        'subly_import_peak_memory_bytes', 'Peak memory of one import by parser and mode (kind: rss/traced)',
+        ['parser', 'mode', 'kind'], buckets=IMPORT_MEMORY_BUCKETS
+    )
+    IMPORT_MEMORY_BUDGET = Counter(
+        'subly_import_memory_budget_total', 'Imports over the memory budget by action (streaming/rejected/exceeded)',
+        ['action']
+    )
+
+def observe_import(source, started, rows, status='ok'):
+    """Record one import job started at perf_counter() value 'started'"""
+    if Counter is None:
+        return
+    IMPORT_DURATION.labels(source, status).observe(time.perf_counter() - started)
+    if status == 'ok':
+        IMPORT_ROWS.labels(source).observe(rows)
+
+def observe_import_memory(parser, mode, peak_rss, peak_traced):
+    """Record peak memory (bytes, None = not measured) of one import"""
+    if Counter is None:
+        return
+    if peak_rss is not None:
+        IMPORT_PEAK_MEMORY.labels(parser, mode, 'rss').observe(peak_rss)
+    if peak_traced is not None:
+        IMPORT_PEAK_MEMORY.labels(parser, mode, 'traced').observe(peak_traced)
+
+def record_import_budget(action):
+    """Count an import that did not fit the memory budget"""
+    if Counter is not None:
+        IMPORT_MEMORY_BUDGET.labels(action).inc()
+
+# Potomci metrik podle štítků - .labels() se volá jen poprvé pro danou kombinaci
+_children = {}
+
+def _request_children(endpoint, method, status):
+    key = (endpoint, method, status)
+    children = _children.get(key)
+    if children is None:
+        children = _children[key] = (
+            REQUESTS.labels(endpoint, method, str(status)),
+            REQUEST_LATENCY.labels(endpoint, method),
+            DB_QUERIES.labels(endpoint),
+            DB_TIME.labels(endpoint),
+        )
+    return children
+
+def _record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    if endpoint in EXCLUDED_ENDPOINTS:
+        return response
+    stats = current_stats()
+    if stats is None:
+        return response
+
+    requests_total, latency, db_queries, db_time = _request_children(
+        endpoint, request.method, response.status_code
+    )
+    requests_total.inc()
+    latency.observe(stats.elapsed)
+    db_queries.observe(stats.db_queries)
+    db_time.observe(stats.db_time)
+    return response
+
+def _registry():
+    """Registry aggregating all workers in multiprocess mode, the default one otherwise"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def init_metrics(app):
+    """Register request hooks and the /metrics endpoint"""
+    if Counter is None:
+        app.logger.info("prometheus_client is not installed, /metrics is disabled")
+        return
+
+    app.after_request(_record_request)
+
+    if app.config.get('METRICS_REQUIRE_TOKEN') and not app.config.get('METRICS_TOKEN'):
+        # V produkci se metriky bez tokenu nevystavují anonymně
+        app.logger.warning("METRICS_TOKEN is not set, /metrics is disabled")
+        return
+
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus scrape endpoint (optionally protected by METRICS_TOKEN)"""
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f"Bearer {token}"):
+                abort(401)
+        return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,76 @@
+"""add_normalized_cost_columns
+
+Revision ID: a3c81f0d4e52
+Revises: 5dcfebeb9066
+Create Date: 2026-10-19 10:12:41.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from decimal import Decimal, ROUND_HALF_UP
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c81f0d4e52'
+down_revision = '5dcfebeb9066'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 10000
+
+
+def _half_up(value):
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _cost_minor(price, billing_cycle):
+    """(monthly, yearly) cost in haléř as of this revision: Decimal ROUND_HALF_UP"""
+    price_minor = _half_up(Decimal(str(price or 0)) * 100)
+    if billing_cycle == 'měsíčně':
+        return price_minor, price_minor * 12
+    if billing_cycle == 'ročně':
+        return _half_up(Decimal(price_minor) / 12), price_minor
+    return price_minor, price_minor
+
+
+def upgrade():
+    # Denormalized monthly/yearly cost in haléř, maintained by ORM events on write
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('monthly_cost_minor', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('yearly_cost_minor', sa.Integer(), nullable=True))
+
+    # Backfill existing rows in Python with the same half-up rule as models.calculate_cost_minor
+    # (SQL ROUND differs between databases); frozen copy below, not an import of live app code
+    subscription = sa.table(
+        'subscription',
+        sa.column('id', sa.Integer), sa.column('price', sa.Float), sa.column('billing_cycle', sa.String),
+        sa.column('monthly_cost_minor', sa.Integer), sa.column('yearly_cost_minor', sa.Integer),
+    )
+    update = (
+        subscription.update()
+        .where(subscription.c.id == sa.bindparam('row_id'))
+        .values(monthly_cost_minor=sa.bindparam('monthly'), yearly_cost_minor=sa.bindparam('yearly'))
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(subscription.c.id, subscription.c.price, subscription.c.billing_cycle)
+            .where(subscription.c.id > last_id)
+            .order_by(subscription.c.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        values = []
+        for row_id, price, billing_cycle in rows:
+            monthly, yearly = _cost_minor(price, billing_cycle)
+            values.append({'row_id': row_id, 'monthly': monthly, 'yearly': yearly})
+        bind.execute(update, values)
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.drop_column('yearly_cost_minor')
+        batch_op.drop_column('monthly_cost_minor')
@@ -0,0 +1,42 @@
+"""composite_and_partial_indexes
+
+Revision ID: c47e2b9a61f3
+Revises: a3c81f0d4e52
+Create Date: 2026-10-19 11:03:27.518264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e2b9a61f3'
+down_revision = 'a3c81f0d4e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing duplicates (same user, same name) would break the unique index -
+    # keep the oldest row and suffix the others with their id, cutting the name to fit VARCHAR(120)
+    op.execute(
+        "UPDATE subscription SET name = "
+        "SUBSTR(name, 1, 120 - LENGTH(' (' || CAST(id AS VARCHAR(20)) || ')')) "
+        "|| ' (' || CAST(id AS VARCHAR(20)) || ')' "
+        "WHERE id NOT IN (SELECT MIN(id) FROM subscription GROUP BY user_id, name)"
+    )
+
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        # (user_id, name) covers every user_id lookup, the single-column index is redundant
+        batch_op.drop_index(batch_op.f('ix_subscription_user_id'))
+        batch_op.create_unique_constraint('uq_subscription_user_id_name', ['user_id', 'name'])
+        # Serves the upcoming-payments query including its is_active filter - a partial index
+        # on the same columns showed no plan this one does not already cover
+        batch_op.create_index('ix_subscription_user_id_next_payment', ['user_id', 'next_payment'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.drop_index('ix_subscription_user_id_next_payment')
+        batch_op.drop_constraint('uq_subscription_user_id_name', type_='unique')
+        batch_op.create_index(batch_op.f('ix_subscription_user_id'), ['user_id'], unique=False)
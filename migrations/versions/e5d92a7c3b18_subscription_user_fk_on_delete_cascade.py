@@ -0,0 +1,29 @@
+"""subscription_user_fk_on_delete_cascade
+
+Revision ID: e5d92a7c3b18
+Revises: c47e2b9a61f3
+Create Date: 2026-10-19 13:41:09.882310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5d92a7c3b18'
+down_revision = 'c47e2b9a61f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deleting a user removes its subscriptions in the database, without loading them into the ORM
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_subscription_user_id', type_='foreignkey')
+        batch_op.create_foreign_key('fk_subscription_user_id', 'user', ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_subscription_user_id', type_='foreignkey')
+        batch_op.create_foreign_key('fk_subscription_user_id', 'user', ['user_id'], ['id'])
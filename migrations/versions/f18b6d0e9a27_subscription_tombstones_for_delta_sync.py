@@ -0,0 +1,44 @@
+"""subscription_tombstones_for_delta_sync
+
+Revision ID: f18b6d0e9a27
+Revises: e5d92a7c3b18
+Create Date: 2026-10-19 15:20:54.107733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f18b6d0e9a27'
+down_revision = 'e5d92a7c3b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('subscription_tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('subscription_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_subscription_tombstone_user_id', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('subscription_tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_subscription_tombstone_user_id_deleted_at', ['user_id', 'deleted_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_subscription_tombstone_deleted_at'), ['deleted_at'], unique=False)
+
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.create_index('ix_subscription_user_id_updated_at', ['user_id', 'updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('subscription', schema=None) as batch_op:
+        batch_op.drop_index('ix_subscription_user_id_updated_at')
+
+    with op.batch_alter_table('subscription_tombstone', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_subscription_tombstone_deleted_at'))
+        batch_op.drop_index('ix_subscription_tombstone_user_id_deleted_at')
+
+    op.drop_table('subscription_tombstone')
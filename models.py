@@ -4,13 +4,27 @@ Obsahuje modely User a Subscription s validačními funkcemi
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
+import sqlite3
+
+from payments import calculate_next_payment, to_minor
 
 # Inicializace SQLAlchemy
 db = SQLAlchemy()
 
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite enforces foreign keys (and ON DELETE CASCADE) only when enabled per connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 class User(db.Model):
     """Model uživatele pro autentifikaci a správu uživatelů"""
     __tablename__ = 'user'
@@ -22,8 +36,9 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     
-    # Relationship to subscriptions
-    subscriptions = db.relationship('Subscription', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Relationship to subscriptions - mazání řeší databáze (ON DELETE CASCADE), bez načítání do session
+    subscriptions = db.relationship('Subscription', backref='user', lazy=True, cascade='all, delete-orphan',
+                                    passive_deletes=True)
     
     def set_password(self, password):
         """Hash and set password"""
@@ -33,6 +48,12 @@ class User(db.Model):
         """Check if provided password matches hash"""
         return check_password_hash(self.password, password)
     
+    def count_subscriptions(self):
+        """Count user subscriptions with a single COUNT query (without loading them)"""
+        return db.session.query(db.func.count(Subscription.id)).filter(
+            Subscription.user_id == self.id
+        ).scalar()
+    
     def to_dict(self):
         """Convert user to dictionary (excluding sensitive data)"""
         return {
@@ -40,7 +61,7 @@ class User(db.Model):
             'email': self.email,
             'name': self.name,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'subscription_count': len(self.subscriptions)
+            'subscription_count': self.count_subscriptions()
         }
     
     def __repr__(self):
@@ -49,6 +70,14 @@ class User(db.Model):
 class Subscription(db.Model):
     """Subscription model for managing user subscriptions"""
     __tablename__ = 'subscription'
+    __table_args__ = (
+        # Kontrola duplicit a řazení podle názvu v rámci uživatele
+        db.UniqueConstraint('user_id', 'name', name='uq_subscription_user_id_name'),
+        # Nadcházející platby uživatele
+        db.Index('ix_subscription_user_id_next_payment', 'user_id', 'next_payment'),
+        # Delta synchronizace (změny od tokenu)
+        db.Index('ix_subscription_user_id_updated_at', 'user_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False, index=True)
@@ -63,8 +92,13 @@ class Subscription(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Přepočtené náklady v haléřích - udržované ORM eventy při zápisu
+    monthly_cost_minor = db.Column(db.Integer, nullable=True)
+    yearly_cost_minor = db.Column(db.Integer, nullable=True)
+    
     # Foreign key to user
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_subscription_user_id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_subscription_user_id', ondelete='CASCADE'),
+                        nullable=False)
     
     def __init__(self, **kwargs):
         super(Subscription, self).__init__(**kwargs)
@@ -74,27 +108,21 @@ class Subscription(db.Model):
     
     def _generate_icon_filename(self):
         """Generate icon filename from subscription name"""
-        if not self.name:
-            return None
-        # Remove special characters and convert to lowercase
-        clean_name = re.sub(r'[^a-z0-9]+', '', self.name.lower())
-        return f"{clean_name}.svg"
+        return generate_icon_filename(self.name)
+    
+    def get_cost_minor(self):
+        """Return (monthly, yearly) cost in haléř, computed only for rows not yet flushed"""
+        if self.monthly_cost_minor is None or self.yearly_cost_minor is None:
+            return calculate_cost_minor(self.price, self.billing_cycle)
+        return self.monthly_cost_minor, self.yearly_cost_minor
     
     def calculate_monthly_cost(self):
         """Calculate monthly cost based on billing cycle"""
-        if self.billing_cycle == "měsíčně":
-            return self.price
-        elif self.billing_cycle == "ročně":
-            return round(self.price / 12, 2)
-        return self.price
+        return self.get_cost_minor()[0] / 100
     
     def calculate_yearly_cost(self):
         """Calculate yearly cost based on billing cycle"""
-        if self.billing_cycle == "měsíčně":
-            return self.price * 12
-        elif self.billing_cycle == "ročně":
-            return self.price
-        return self.price
+        return self.get_cost_minor()[1] / 100
     
     def is_payment_due_soon(self, days=7):
         """Check if payment is due within specified days"""
@@ -108,52 +136,7 @@ class Subscription(db.Model):
         """Update next payment date based on billing cycle and start date"""
         if not self.start_date:
             return
-        
-        from datetime import date, timedelta
-        
-        today = date.today()
-        next_payment = None
-        
-        if self.billing_cycle == "měsíčně":
-            # Najdi nejbližší budoucí měsíční platbu
-            from dateutil.relativedelta import relativedelta
-            
-            # Vypočítej správné datum v aktuálním měsíci
-            # Pokud je start_date v budoucnosti, použij start_date
-            if self.start_date > today:
-                next_payment = self.start_date
-            else:
-                # Najdi první budoucí platbu v aktuálním měsíci
-                import calendar
-                
-                # Zkontroluj, jestli aktuální měsíc má dostatek dní pro start_date.day
-                last_day_of_month = calendar.monthrange(today.year, today.month)[1]
-                
-                if self.start_date.day <= last_day_of_month:
-                    # Měsíc má dostatek dní, použij start_date.day
-                    current_month_payment = today.replace(day=self.start_date.day)
-                else:
-                    # Měsíc nemá dostatek dní, použij poslední den měsíce
-                    current_month_payment = today.replace(day=last_day_of_month)
-                
-                # Pokud je dnešní den větší než current_month_payment, použij příští měsíc
-                if current_month_payment <= today:
-                    next_payment = current_month_payment + relativedelta(months=1)
-                else:
-                    next_payment = current_month_payment
-            
-        elif self.billing_cycle == "ročně":
-            # Najdi nejbližší budoucí roční platbu
-            if self.start_date > today:
-                # Pokud je start_date v budoucnosti, next_payment je start_date
-                next_payment = self.start_date
-            else:
-                # Najdi první budoucí roční platbu
-                next_payment = self.start_date.replace(year=self.start_date.year + 1)
-                while next_payment < today:
-                    next_payment = next_payment.replace(year=next_payment.year + 1)
-        
-        self.next_payment = next_payment
+        self.next_payment = calculate_next_payment(self.start_date, self.billing_cycle)
     
     def to_dict(self):
         """Convert subscription to dictionary"""
@@ -178,6 +161,67 @@ class Subscription(db.Model):
     def __repr__(self):
         return f'<Subscription {self.name} - {self.price} Kč>'
 
+class SubscriptionTombstone(db.Model):
+    """Deletion log entry used by the delta-sync API to report deleted subscriptions"""
+    __tablename__ = 'subscription_tombstone'
+    __table_args__ = (
+        db.Index('ix_subscription_tombstone_user_id_deleted_at', 'user_id', 'deleted_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_subscription_tombstone_user_id', ondelete='CASCADE'),
+                        nullable=False)
+    subscription_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<SubscriptionTombstone {self.subscription_id} @ {self.deleted_at}>'
+
+class AuditEvent(db.Model):
+    """Audit trail entry written in batches by the background audit writer"""
+    __tablename__ = 'audit_event'
+    __table_args__ = (
+        db.Index('ix_audit_event_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Bez cizího klíče - záznam má přežít i smazání uživatele
+    user_id = db.Column(db.Integer, nullable=True)
+    action = db.Column(db.String(50), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    ip_address = db.Column(db.String(45), nullable=True)
+    user_agent = db.Column(db.String(255), nullable=True)
+    details = db.Column(db.JSON, nullable=True)
+
+    def __repr__(self):
+        return f'<AuditEvent {self.action} user={self.user_id} @ {self.created_at}>'
+
+def generate_icon_filename(name):
+    """Generate icon filename from subscription name"""
+    if not name:
+        return None
+    # Remove special characters and convert to lowercase
+    clean_name = re.sub(r'[^a-z0-9]+', '', name.lower())
+    return f"{clean_name}.svg"
+
+def calculate_cost_minor(price, billing_cycle):
+    """Calculate (monthly, yearly) cost in haléř based on billing cycle"""
+    # Zaokrouhlení vždy half up (stejně jako backfill v migraci), ne bankéřské round()
+    price_minor = to_minor(price)
+    if billing_cycle == "měsíčně":
+        return price_minor, price_minor * 12
+    elif billing_cycle == "ročně":
+        return int((Decimal(price_minor) / 12).quantize(Decimal(1), rounding=ROUND_HALF_UP)), price_minor
+    return price_minor, price_minor
+
+@event.listens_for(Subscription, 'before_insert')
+@event.listens_for(Subscription, 'before_update')
+def _update_cost_columns(mapper, connection, target):
+    """Keep denormalized cost columns in sync with price and billing cycle"""
+    target.monthly_cost_minor, target.yearly_cost_minor = calculate_cost_minor(
+        target.price, target.billing_cycle
+    )
+
 # Validation functions
 def validate_subscription_data(data):
     """Validate subscription data"""
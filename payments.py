@@ -0,0 +1,214 @@
+"""
+Výpočty plateb předplatných pro aplikaci Subly
+Obsahuje dávkový (vektorizovaný) výpočet data další platby nad poli předplatných
+a líné generování kalendáře plateb
+"""
+
+import heapq
+import calendar
+import importlib
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+class _LazyModule:
+    """Module stand-in importing the real module on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+# numpy se načte až při prvním výpočtu - web worker ani CLI ho při startu nepotřebují
+np = _LazyModule('numpy')
+
+# Délka jednoho platebního období v měsících
+CYCLE_MONTHS = {
+    "měsíčně": 1,
+    "ročně": 12,
+}
+
+def to_minor(amount):
+    """Amount in Kč (float) to whole haléř, rounding half up (0.5 away from zero)"""
+    # Přes str(), aby se 12.06 nezaokrouhlovalo jako 12.0599999...
+    return int((Decimal(str(amount or 0)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def _clamp_to_month(months, days):
+    """Combine datetime64[M] months with day-of-month, clamping to the last day of the month"""
+    month_start = months.astype('datetime64[D]')
+    month_length = ((months + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+    return month_start + (np.minimum(days, month_length) - 1)
+
+def calculate_next_payments(start_dates, billing_cycles, today=None):
+    """
+    Calculate next payment dates for arrays of start dates and billing cycles
+
+    Platba připadá vždy na den začátku předplatného (u kratších měsíců na poslední den).
+    Měsíční platba splatná dnes se posouvá na další měsíc, roční zůstává dnes.
+    Vrací seznam datetime.date (None pro chybějící start_date nebo neznámý cyklus).
+    """
+    # numpy se načítá až při prvním výpočtu - start workeru a CLI ho nepotřebují
+    today = np.datetime64(today or date.today(), 'D')
+    starts = np.asarray(start_dates, dtype='datetime64[D]')
+    if starts.size == 0:
+        return []
+
+    steps = np.array([CYCLE_MONTHS.get(cycle, 0) for cycle in billing_cycles], dtype=np.int64)
+    valid = ~np.isnat(starts) & (steps > 0)
+    steps = np.where(valid, steps, 1)
+    starts = np.where(valid, starts, today)
+
+    start_months = starts.astype('datetime64[M]')
+    anchor_days = (starts - start_months.astype('datetime64[D]')).astype(np.int64) + 1
+
+    # Poslední období začínající nejpozději v aktuálním měsíci
+    months_since = (today.astype('datetime64[M]') - start_months).astype(np.int64)
+    offsets = (months_since // steps) * steps
+    # Roční platba je nejdříve rok po začátku
+    offsets = np.where(steps > 1, np.maximum(offsets, steps), offsets)
+    candidates = _clamp_to_month(start_months + offsets, anchor_days)
+
+    # Pokud kandidát už proběhl, posuň o jedno období
+    passed = np.where(steps == 1, candidates <= today, candidates < today)
+    offsets = np.where(passed, offsets + steps, offsets)
+    next_payments = _clamp_to_month(start_months + offsets, anchor_days)
+
+    # Začátek v budoucnosti je zároveň první platbou
+    next_payments = np.where(starts > today, starts, next_payments)
+    next_payments = np.where(valid, next_payments, np.datetime64('NaT'))
+    return next_payments.astype(object).tolist()
+
+def calculate_next_payment(start_date, billing_cycle, today=None):
+    """Calculate next payment date for a single subscription"""
+    if not start_date:
+        return None
+    return calculate_next_payments([start_date], [billing_cycle], today=today)[0]
+
+def _month_index(value):
+    """Months since year 0 for a date"""
+    return value.year * 12 + value.month - 1
+
+def _date_in_month(month_index, day):
+    """Date in given month, clamping day to the last day of the month"""
+    year, month = divmod(month_index, 12)
+    if day > 28:
+        day = min(day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day)
+
+def iter_payment_occurrences(next_payment, billing_cycle, date_from, date_to, anchor_day=None):
+    """
+    Lazily yield payment dates of one subscription within <date_from, date_to>
+    Projekce začíná u next_payment, další platby připadají na anchor_day (den začátku předplatného)
+    """
+    step = CYCLE_MONTHS.get(billing_cycle)
+    if not step or not next_payment or next_payment > date_to:
+        return
+    anchor_day = anchor_day or next_payment.day
+
+    if next_payment >= date_from:
+        yield next_payment
+
+    # Přeskoč rovnou na první období v rozsahu, bez procházení mezilehlých
+    month = _month_index(next_payment) + step
+    missing = _month_index(date_from) - month
+    if missing > 0:
+        month += (missing // step) * step
+
+    while True:
+        occurrence = _date_in_month(month, anchor_day)
+        if occurrence > date_to:
+            return
+        if occurrence >= date_from:
+            yield occurrence
+        month += step
+
+def _subscription_occurrences(subscription, date_from, date_to):
+    """Occurrence stream of one subscription as (date, id, subscription) heap items"""
+    anchor_day = subscription.start_date.day if subscription.start_date else None
+    for occurrence in iter_payment_occurrences(
+        subscription.next_payment, subscription.billing_cycle, date_from, date_to, anchor_day=anchor_day
+    ):
+        yield occurrence, subscription.id, subscription
+
+def iter_payment_calendar(subscriptions, date_from, date_to):
+    """
+    Yield (date, subscription) for all payment occurrences ordered by date
+    Proudy jednotlivých předplatných se slučují haldou - paměť nezávisí na délce rozsahu
+    """
+    streams = [_subscription_occurrences(subscription, date_from, date_to) for subscription in subscriptions]
+    for occurrence, _, subscription in heapq.merge(*streams, key=lambda item: item[:2]):
+        yield occurrence, subscription
+
+def build_cost_matrix(subscriptions, months, start=None):
+    """
+    Build subscriptions x months matrix of payments in haléř
+    Předplatná bez next_payment se rozpočítají po měsících (monthly_cost_minor)
+    """
+    start_month = _month_index(start or date.today())
+    count = len(subscriptions)
+    if count == 0:
+        return np.zeros((0, months), dtype=np.int64)
+
+    prices = np.array([to_minor(sub.price) for sub in subscriptions], dtype=np.int64)
+    monthly = np.array([sub.monthly_cost_minor or 0 for sub in subscriptions], dtype=np.int64)
+    steps = np.array([CYCLE_MONTHS.get(sub.billing_cycle, 1) for sub in subscriptions], dtype=np.int64)
+    scheduled = np.array([sub.next_payment is not None for sub in subscriptions])
+    first = np.array(
+        [_month_index(sub.next_payment) - start_month if sub.next_payment else 0 for sub in subscriptions],
+        dtype=np.int64
+    )
+
+    offsets = np.arange(months, dtype=np.int64)[np.newaxis, :] - first[:, np.newaxis]
+    due = (offsets >= 0) & (offsets % steps[:, np.newaxis] == 0)
+    matrix = np.where(due, prices[:, np.newaxis], 0)
+    return np.where(scheduled[:, np.newaxis], matrix, monthly[:, np.newaxis])
+
+def _totals(monthly_minor):
+    """Convert monthly totals in haléř to monthly and cumulative amounts in Kč"""
+    return {
+        'monthly': (monthly_minor / 100).tolist(),
+        'cumulative': (np.cumsum(monthly_minor) / 100).tolist()
+    }
+
+def forecast_spend(subscriptions, months, cancelled_ids=(), start=None):
+    """
+    Forecast spend for upcoming months, overall and per category
+    What-if zrušení se aplikuje maskou nad stejnou maticí, bez nového výpočtu
+    """
+    start = start or date.today()
+    start_month = _month_index(start)
+    labels = [f"{year:04d}-{month + 1:02d}" for year, month in
+              (divmod(start_month + offset, 12) for offset in range(months))]
+
+    matrix = build_cost_matrix(subscriptions, months, start=start)
+    ids = np.array([sub.id for sub in subscriptions], dtype=np.int64)
+    categories = np.array([sub.category for sub in subscriptions], dtype=object)
+
+    by_category = {}
+    if len(subscriptions):
+        names, inverse = np.unique(categories.astype(str), return_inverse=True)
+        category_sums = np.zeros((len(names), months), dtype=np.int64)
+        np.add.at(category_sums, inverse, matrix)
+        by_category = {name: _totals(category_sums[i]) for i, name in enumerate(names)}
+
+    total = matrix.sum(axis=0)
+    result = {
+        'months': labels,
+        'total': _totals(total),
+        'categories': by_category
+    }
+
+    if cancelled_ids:
+        cancelled = np.isin(ids, list(cancelled_ids))
+        remaining = matrix[~cancelled].sum(axis=0)
+        savings = matrix[cancelled].sum(axis=0)
+        result['what_if'] = {
+            'cancelled': ids[cancelled].tolist(),
+            'total': _totals(remaining),
+            'savings': _totals(savings)
+        }
+
+    return result
@@ -0,0 +1,164 @@
+"""
+Profilování živých požadavků pro aplikaci Subly
+Požadavek s hlavičkou X-Profile (hodnota = PROFILER_TOKEN) nebo od uživatele uvedeného
+v PROFILER_USERS se změří cProfile a zároveň vzorkováním zásobníku; výsledky se ukládají
+do PROFILES_FOLDER (.prof pro pstats/snakeviz, .folded pro flamegraph.pl/speedscope)
+"""
+
+import os
+import sys
+import hmac
+import time
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request, session
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+class StackSampler:
+    """Background thread sampling one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Samples in collapsed-stack format: 'frame;frame;frame count' per line"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class RequestProfile:
+    """cProfile plus stack sampler running for the current request's thread"""
+
+    def __init__(self, interval):
+        self.started = time.perf_counter()
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.stop()
+        return time.perf_counter() - self.started
+
+def _profiling_requested(app):
+    """Admin gate: secret header token or a user listed in PROFILER_USERS"""
+    token = app.config.get('PROFILER_TOKEN')
+    supplied = request.headers.get(PROFILE_HEADER)
+    if token and supplied and hmac.compare_digest(supplied, token):
+        return True
+    users = app.config.get('PROFILER_USERS')
+    return bool(users) and session.get('user_id') in users
+
+def _rotate(folder, keep):
+    """Keep only the newest 'keep' profiles (a profile = .prof + .folded pair)"""
+    names = sorted(
+        (entry for entry in os.scandir(folder) if entry.name.endswith('.prof')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in names[:-keep] if keep else names:
+        base = entry.path[:-len('.prof')]
+        for path in (entry.path, base + '.folded'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def _save(app, profile, duration):
+    folder = app.config['PROFILES_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    name = '_'.join((
+        datetime.utcnow().strftime('%Y%m%dT%H%M%S'),
+        request.endpoint or 'unmatched',
+        g.get('request_id') or str(os.getpid()),
+    ))
+    base = os.path.join(folder, name)
+    profile.profiler.dump_stats(base + '.prof')
+    with open(base + '.folded', 'w', encoding='utf-8') as folded:
+        folded.write(profile.sampler.collapsed())
+    _rotate(folder, app.config.get('PROFILES_KEEP', 50))
+    logger.info(f"Request profile saved: {name} ({duration * 1000:.1f} ms, "
+                f"{sum(profile.sampler.samples.values())} samples)")
+    return name
+
+def _parse_user_ids(value):
+    """PROFILER_USERS as a set of ints - a comma-separated string or a list; invalid entries are logged and skipped"""
+    entries = value.split(',') if isinstance(value, str) else (value or ())
+    user_ids = set()
+    for entry in entries:
+        if isinstance(entry, str) and not entry.strip():
+            continue
+        try:
+            user_ids.add(int(entry))
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid PROFILER_USERS entry: {entry!r}")
+    return frozenset(user_ids)
+
+def init_profiling(app):
+    """Register hooks profiling admin-selected requests (no-op unless a token or users are configured)"""
+    # Překlep v proměnné prostředí nesmí shodit start aplikace
+    app.config['PROFILER_USERS'] = _parse_user_ids(app.config.get('PROFILER_USERS'))
+    if not app.config.get('PROFILER_TOKEN') and not app.config.get('PROFILER_USERS'):
+        return
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint == 'static' or not _profiling_requested(app):
+            return
+        profile = RequestProfile(app.config.get('PROFILER_INTERVAL_MS', 5) / 1000)
+        try:
+            profile.start()
+        except ValueError as e:
+            # Jiný profiler (debugger, coverage) už běží
+            profile.sampler.stop()
+            logger.warning(f"Request profiling skipped: {e}")
+            return
+        g.profile = profile
+
+    @app.after_request
+    def announce_profile(response):
+        # U streamovaných odpovědí se profil uloží až po odeslání těla (teardown)
+        if 'profile' in g:
+            response.headers['X-Profile-Id'] = g.get('request_id', '')
+        return response
+
+    @app.teardown_request
+    def save_profile(exception=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        duration = profile.stop()
+        try:
+            _save(app, profile, duration)
+        except OSError as e:
+            logger.error(f"Saving request profile failed: {e}")
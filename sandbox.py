@@ -0,0 +1,254 @@
+"""
+Izolované zpracování nahraných výpisů pro aplikaci Subly
+Parsování běží v malém poolu předem spuštěných procesů s limity RLIMIT_AS a RLIMIT_CPU
+a časovým limitem; patologický soubor tak shodí nanejvýš parsovací proces, ne web worker.
+Výsledek se vrací rourou (multiprocessing.Pipe), chyby jako ParseError
+"""
+
+import os
+import queue
+import atexit
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+try:
+    import resource
+except ImportError:  # Mimo POSIX nejsou rlimity k dispozici, parsuje se ve web workeru
+    resource = None
+
+from instrumentation import timed
+from memory import MemoryMonitor, MB
+from utils import process_bank_statement_upload, StatementFormatError
+
+logger = logging.getLogger(__name__)
+
+class ParseError(ValueError):
+    """
+    Upload could not be parsed: invalid file, limit exceeded or worker crash
+    user_message lze ukázat uživateli; None = text výjimky z parseru, uživatel dostane obecnou zprávu
+    """
+
+    def __init__(self, message, user_message=None):
+        super().__init__(message)
+        self.user_message = user_message
+
+def _user_message(error):
+    """Message safe to show for an exception raised while parsing (None for internal errors)"""
+    return str(error) if isinstance(error, StatementFormatError) else None
+
+def parse_statement(file_path, mode, trace=False):
+    """Parse one statement under a MemoryMonitor; returns (subscriptions, stats with parser, rows and peaks)"""
+    stats = {}
+    with MemoryMonitor(trace=trace) as monitor:
+        subscriptions = process_bank_statement_upload(file_path, mode=mode, stats=stats)
+    stats['peak_rss'] = monitor.peak_rss
+    stats['peak_traced'] = monitor.peak_traced
+    stats['retained_allocations'] = monitor.top_allocations()
+    return subscriptions, stats
+
+def _address_space():
+    """Current virtual memory size of this process in bytes (None where /proc is not available)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _limit_address_space(memory_mb):
+    # Limit je nad velikost procesu po startu - samotné knihovny (numpy, pandas) si rezervují hodně adres
+    baseline = _address_space()
+    if memory_mb and baseline is not None:
+        limit = baseline + memory_mb * MB
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+def _limit_cpu(cpu_seconds):
+    # RLIMIT_CPU počítá celkový čas procesu - měkký limit se posouvá před každou úlohou
+    if not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    soft = used + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _worker_main(conn, memory_mb):
+    """Parse worker loop: receive (file_path, mode, trace, cpu_seconds), reply ('ok', result) or ('error', (message, user_message))"""
+    # Ctrl+C / SIGINT řeší rodič, worker se ukončí zavřením roury
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _limit_address_space(memory_mb)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        file_path, mode, trace, cpu_seconds = task
+        _limit_cpu(cpu_seconds)
+        try:
+            conn.send(('ok', parse_statement(file_path, mode, trace)))
+        except MemoryError:
+            # Po MemoryError může být stav procesu nespolehlivý - worker skončí a pool ho nahradí
+            message = "Zpracování souboru překročilo paměťový limit"
+            conn.send(('error', (message, message)))
+            return
+        except Exception as e:
+            conn.send(('error', (str(e), _user_message(e))))
+
+class _Worker:
+    """One pre-started parse process and the parent's end of its pipe"""
+
+    def __init__(self, context, memory_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_mb), name='subly-parse-worker', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+# Konec workeru podle signálu -> srozumitelná chyba
+_SIGNAL_ERRORS = {
+    signal.SIGKILL: "Zpracování souboru bylo ukončeno (nejspíš paměťový limit)",
+}
+if hasattr(signal, 'SIGXCPU'):
+    _SIGNAL_ERRORS[signal.SIGXCPU] = "Zpracování souboru překročilo limit procesorového času"
+
+class ParseWorkerPool:
+    """
+    Small pool of pre-started parse processes shared by the web worker's threads
+    Procesy vznikají přes forkserver (čistý proces bez vláken a spojení web workeru,
+    s předem načtenými knihovnami). Pool patří jednomu web workeru: pod gunicornem se spouští
+    v post_fork, jinak líně při prvním importu (a po forku znovu)
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.timeout = 30
+        self.cpu_seconds = 20
+        self.memory_mb = 512
+        self._context = None
+        self._idle = None
+        self._workers = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read configuration; IMPORT_WORKERS = 0 parses in the web worker itself"""
+        self.size = app.config.get('IMPORT_WORKERS', 1) if resource is not None else 0
+        self.timeout = app.config.get('IMPORT_TIMEOUT', self.timeout)
+        self.cpu_seconds = app.config.get('IMPORT_CPU_SECONDS', self.cpu_seconds)
+        self.memory_mb = app.config.get('IMPORT_WORKER_MEMORY_MB', self.memory_mb)
+        atexit.register(self.stop)
+
+    def _context_for_workers(self):
+        if 'forkserver' not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('spawn')
+        context = multiprocessing.get_context('forkserver')
+        # Forkserver si jednou načte parsery i pandas, nové workery je už jen forkují
+        context.set_forkserver_preload(['sandbox', 'pandas'])
+        return context
+
+    def start(self):
+        """Start the forkserver and workers now (gunicorn post_fork) instead of on the first upload"""
+        if self.size:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        """Start the workers lazily (again after fork - the parent's workers belong to the parent)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._context = self._context_for_workers()
+            self._idle = queue.Queue()
+            self._workers = [_Worker(self._context, self.memory_mb) for _ in range(self.size)]
+            for worker in self._workers:
+                self._idle.put(worker)
+            self._pid = os.getpid()
+
+    def _replace(self, worker):
+        worker.kill()
+        replacement = _Worker(self._context, self.memory_mb)
+        with self._lock:
+            self._workers = [replacement if w is worker else w for w in self._workers]
+        return replacement
+
+    # Jediné měření parsování - pokrývá pool i parsování přímo ve web workeru (size 0)
+    @timed('parse')
+    def parse(self, file_path, mode, trace=False):
+        """Parse an uploaded statement in a worker; returns (subscriptions, stats) or raises ParseError"""
+        if not self.size:
+            try:
+                return parse_statement(file_path, mode, trace)
+            except ValueError as e:
+                raise ParseError(str(e), _user_message(e))
+
+        self._ensure_started()
+        # Jeden termín pro čekání na volný proces i na výsledek - celkem nejvýše self.timeout
+        deadline = time.monotonic() + self.timeout
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            message = "Všechny parsovací procesy jsou obsazené, zkuste to prosím znovu"
+            raise ParseError(message, message)
+
+        try:
+            if not worker.alive:
+                worker = self._replace(worker)
+            try:
+                worker.conn.send((os.path.abspath(file_path), mode, trace, self.cpu_seconds))
+                if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                    logger.warning(f"Parse worker timed out after {self.timeout}s on {os.path.basename(file_path)}")
+                    worker = self._replace(worker)
+                    message = "Zpracování souboru trvalo příliš dlouho"
+                    raise ParseError(message, message)
+                status, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.process.join(1)
+                exit_code = worker.process.exitcode
+                logger.warning(f"Parse worker died (exit code {exit_code}) on {os.path.basename(file_path)}")
+                worker = self._replace(worker)
+                message = _SIGNAL_ERRORS.get(-(exit_code or 0), "Zpracování souboru selhalo")
+                raise ParseError(message, message)
+        finally:
+            self._idle.put(worker)
+
+        if status == 'error':
+            raise ParseError(*payload)
+        return payload
+
+    def stop(self):
+        """Stop all workers of this process"""
+        if self._pid != os.getpid():
+            return
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        self._pid = None
+
+parse_pool = ParseWorkerPool()
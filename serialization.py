@@ -0,0 +1,223 @@
+"""
+Serializace dat pro JSON API aplikace Subly
+Čte řádky přes SQLAlchemy Core (bez ORM objektů) a streamuje JSON pole po částech
+"""
+
+import json
+from datetime import date, datetime, timedelta
+
+from models import db, Subscription, SubscriptionTombstone, calculate_cost_minor
+
+try:
+    import orjson
+except ImportError:  # orjson je volitelný, fallback na standardní json
+    orjson = None
+
+STREAM_CHUNK_SIZE = 500
+PAYMENT_DUE_SOON_DAYS = 7
+# Překryv synchronizačního okna pro transakce, které se commitnou až po vydání tokenu
+SYNC_OVERLAP = timedelta(seconds=5)
+EPOCH = datetime(1970, 1, 1)
+
+# Pole API čtená přímo ze sloupců (v pořadí výchozí odpovědi)
+COLUMN_FIELDS = {
+    'id': Subscription.id,
+    'name': Subscription.name,
+    'price': Subscription.price,
+    'billing_cycle': Subscription.billing_cycle,
+    'category': Subscription.category,
+    'start_date': Subscription.start_date,
+    'next_payment': Subscription.next_payment,
+    'notes': Subscription.notes,
+    'icon_filename': Subscription.icon_filename,
+    'is_active': Subscription.is_active,
+    'created_at': Subscription.created_at,
+    'updated_at': Subscription.updated_at,
+}
+
+# Odvozená pole a sloupce, které potřebují k výpočtu
+COMPUTED_FIELDS = {
+    'monthly_cost': ('monthly_cost_minor', 'price', 'billing_cycle'),
+    'yearly_cost': ('yearly_cost_minor', 'price', 'billing_cycle'),
+    'payment_due_soon': ('next_payment',),
+}
+
+DEFAULT_FIELDS = tuple(COLUMN_FIELDS) + tuple(COMPUTED_FIELDS)
+
+def _default(value):
+    """Fallback encoder for types the standard json module does not know"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+    """Encode value to JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def parse_fields(value):
+    """Parse ?fields= parameter into a list of known field names (None means all fields)"""
+    if not value:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in COLUMN_FIELDS and field not in COMPUTED_FIELDS]
+    if unknown:
+        raise ValueError(f"Neznámá pole: {', '.join(unknown)}")
+    return fields or None
+
+def _cost_getter(position, minor_index, price_index, cycle_index):
+    """Getter for monthly (position 0) or yearly (position 1) cost in Kč"""
+    def getter(row):
+        minor = row[minor_index]
+        if minor is None:
+            minor = calculate_cost_minor(row[price_index], row[cycle_index])[position]
+        return minor / 100
+    return getter
+
+def _due_soon_getter(next_payment_index, today):
+    """Getter for payment_due_soon evaluated against a single 'today'"""
+    due_limit = today + timedelta(days=PAYMENT_DUE_SOON_DAYS)
+    def getter(row):
+        next_payment = row[next_payment_index]
+        return next_payment is not None and today <= next_payment <= due_limit
+    return getter
+
+class SubscriptionProjection:
+    """
+    Column list and derived-field getters for a requested set of API fields
+    Do SELECTu jdou jen sloupce potřebné pro vyžádaná pole, ostatní výpočty se přeskočí
+    """
+
+    def __init__(self, fields=None, today=None):
+        fields = fields or DEFAULT_FIELDS
+        today = today or date.today()
+
+        self.direct = [field for field in fields if field in COLUMN_FIELDS]
+        self.computed = [field for field in fields if field in COMPUTED_FIELDS]
+        self.columns = list(self.direct)
+        for field in self.computed:
+            for column in COMPUTED_FIELDS[field]:
+                if column not in self.columns:
+                    self.columns.append(column)
+
+        index = {column: position for position, column in enumerate(self.columns)}
+        self.getters = []
+        for field in self.computed:
+            if field == 'payment_due_soon':
+                self.getters.append(_due_soon_getter(index['next_payment'], today))
+            else:
+                minor_column, _, _ = COMPUTED_FIELDS[field]
+                position = 0 if field == 'monthly_cost' else 1
+                self.getters.append(_cost_getter(
+                    position, index[minor_column], index['price'], index['billing_cycle']
+                ))
+
+    @property
+    def names(self):
+        """Output field names in row order"""
+        return self.direct + self.computed
+
+    def select(self, user_id, updated_since=None):
+        """Core SELECT of only the needed columns for the user"""
+        columns = [getattr(Subscription, column) for column in self.columns]
+        query = db.select(*columns).where(Subscription.user_id == user_id)
+        if updated_since is not None:
+            query = query.where(Subscription.updated_at > updated_since)
+        return query.order_by(Subscription.id)
+
+    def iter_dicts(self, rows):
+        """Rows as dicts (same shape as Subscription.to_dict for the default fields)"""
+        direct, computed, getters = self.direct, self.computed, self.getters
+        for row in rows:
+            item = dict(zip(direct, row))
+            for name, getter in zip(computed, getters):
+                item[name] = getter(row)
+            yield item
+
+    def iter_lists(self, rows):
+        """Rows as plain value lists for the columnar response shape"""
+        count, getters = len(self.direct), self.getters
+        for row in rows:
+            values = list(row[:count])
+            values.extend(getter(row) for getter in getters)
+            yield values
+
+def stream_json_array(items, chunk_size=STREAM_CHUNK_SIZE):
+    """Encode items as one JSON array, yielding it in chunks of chunk_size items"""
+    yield b'['
+    separator = b''
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            # Jedno volání enkodéru na celou dávku, bez hranatých závorek
+            yield separator + dumps(chunk)[1:-1]
+            separator = b','
+            chunk = []
+    if chunk:
+        yield separator + dumps(chunk)[1:-1]
+    yield b']'
+
+def stream_user_subscriptions(user_id, fields=None, columnar=False):
+    """
+    Stream user's subscriptions as JSON fetched in yield_per batches
+    Sloupcový tvar: {"columns": [...], "rows": [[...], ...]}
+    """
+    projection = SubscriptionProjection(fields)
+    rows = db.session.connection().execute(
+        projection.select(user_id).execution_options(yield_per=STREAM_CHUNK_SIZE)
+    )
+    if not columnar:
+        return stream_json_array(projection.iter_dicts(rows))
+
+    def generate_columnar():
+        yield b'{"columns":' + dumps(projection.names) + b',"rows":'
+        yield from stream_json_array(projection.iter_lists(rows))
+        yield b'}'
+    return generate_columnar()
+
+def encode_sync_token(moment):
+    """Opaque sync token - microseconds since epoch (UTC)"""
+    return str((moment - EPOCH) // timedelta(microseconds=1))
+
+def decode_sync_token(token):
+    """Decode sync token back to a UTC datetime (None for a missing token)"""
+    if not token:
+        return None
+    try:
+        return EPOCH + timedelta(microseconds=int(token))
+    except (ValueError, OverflowError):
+        raise ValueError("Neplatný synchronizační token")
+
+def stream_user_sync(user_id, since, retention, fields=None):
+    """
+    Stream delta-sync response: {"token", "full", "deleted": [ids], "changed": [...]}
+    Bez tokenu (nebo se starším tokenem, než je retence záznamů o smazání) vrací vše s full=true.
+    Klient aplikuje nejdřív 'deleted', potom 'changed' (ID se v SQLite mohou znovu použít).
+    """
+    now = datetime.utcnow()
+    full = since is None or since < now - retention
+    deleted_ids = []
+    updated_since = None
+
+    if not full:
+        updated_since = since - SYNC_OVERLAP
+        deleted_ids = db.session.execute(
+            db.select(SubscriptionTombstone.subscription_id).where(
+                SubscriptionTombstone.user_id == user_id,
+                SubscriptionTombstone.deleted_at > updated_since
+            ).distinct()
+        ).scalars().all()
+
+    projection = SubscriptionProjection(fields)
+    rows = db.session.connection().execute(
+        projection.select(user_id, updated_since=updated_since).execution_options(yield_per=STREAM_CHUNK_SIZE)
+    )
+
+    def generate_sync():
+        yield (b'{"token":' + dumps(encode_sync_token(now)) + b',"full":' + dumps(full)
+               + b',"deleted":' + dumps(deleted_ids) + b',"changed":')
+        yield from stream_json_array(projection.iter_dicts(rows))
+        yield b'}'
+    return generate_sync()
@@ -22,6 +22,11 @@ with app.app_context():
 "
 fi
 
+# Sdílené metriky workerů gunicornu (prometheus_client multiprocess)
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/subly-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start the application
 echo "🌟 Starting Gunicorn server..."
-exec gunicorn --bind 0.0.0.0:$PORT app:app
\ No newline at end of file
+# Workery, vlákna, preload a hooky po forku viz gunicorn.conf.py (when_ready předkompiluje šablony)
+exec gunicorn -c gunicorn.conf.py app:app
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Sdílené fixtures pro testy aplikace Subly
+Každý test dostane vlastní aplikaci (TestingConfig, SQLite v paměti); porušení rozpočtu
+dotazů nebo N+1 nasbíraná během testu (QUERY_BUDGET_STRICT) test shodí
+"""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Modul app při importu vytváří i globální aplikaci - ať je také testovací (bez cache šablon v pracovním adresáři)
+os.environ['FLASK_ENV'] = 'testing'
+
+from app import create_app
+from instrumentation import QueryBudgetExceeded, pop_query_budget_violations
+from models import db, Subscription, User
+
+PASSWORD = 'Passw0rdX'
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        db.create_all()
+    yield app
+    violations = pop_query_budget_violations(app)
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    if violations:
+        raise QueryBudgetExceeded('; '.join(violations))
+
+
+def login(client, email='test@subly.cz'):
+    """Register (and thereby log in) a user through the registration form"""
+    response = client.post('/register', data={
+        'name': 'Test', 'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD
+    })
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def make_client(app):
+    """Factory for logged-in clients - for tests that register routes before the first request"""
+    return lambda: login(app.test_client())
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
+
+
+@pytest.fixture
+def json_headers():
+    """Headers the JSON API requires (require_json)"""
+    return {'Content-Type': 'application/json'}
+
+
+@pytest.fixture
+def add_subscriptions(app):
+    """Factory adding count monthly subscriptions 'Služba <i>' (100 Kč, from 2024-01-15) to the first user"""
+    def add(count):
+        with app.app_context():
+            user = User.query.first()
+            for index in range(count):
+                db.session.add(Subscription(
+                    user_id=user.id, name=f'Služba {index}', price=100, billing_cycle='měsíčně',
+                    category='Ostatní', start_date=date(2024, 1, 15)
+                ))
+            db.session.commit()
+    return add
@@ -0,0 +1,31 @@
+"""Testy auditních záznamů (audit.py)"""
+
+import os
+import queue
+import atexit
+
+from audit import AuditLog
+
+
+def test_details_are_captured_at_record_time(app, monkeypatch):
+    monkeypatch.setattr(atexit, 'register', lambda func: None)
+    audit = AuditLog()
+    audit.init_app(app)
+    audit.enabled = True
+    # Fronta bez zapisovacího vlákna - událost zůstane ve frontě tak, jak ji record() uložil
+    audit._queue, audit._pid = queue.Queue(), os.getpid()
+    details = {'record_count': 1}
+
+    audit.record('export', details=details)
+    details['record_count'] = 2
+
+    assert audit._queue.get_nowait()['details'] == {'record_count': 1}
+
+
+def test_exit_hook_is_registered_once(app, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    audit = AuditLog()
+    audit.init_app(app)
+    audit.init_app(app)
+    assert registered == [audit.stop]
@@ -0,0 +1,72 @@
+"""Testy dávkového API /api/subscriptions/batch (batch.py)"""
+
+from models import Subscription
+
+
+def _ids(app):
+    with app.app_context():
+        return [subscription.id for subscription in Subscription.query.order_by(Subscription.id)]
+
+
+def test_batch_reports_results_per_item(app, client, add_subscriptions, json_headers):
+    add_subscriptions(3)
+    first, second, third = _ids(app)
+
+    response = client.post('/api/subscriptions/batch', headers=json_headers, json={
+        'delete': [first, 'x', 999999],
+        'update': [
+            {'id': second, 'price': 150},
+            {'id': 'abc', 'price': 1},
+            'not an object',
+            {'id': 999999, 'price': 1},
+            {'id': third, 'price': -5},
+        ],
+        'create': [
+            {'name': 'Netflix', 'price': 99, 'billing_cycle': 'monthly'},
+            {'name': 'Služba 1', 'price': 99, 'billing_cycle': 'monthly'},
+        ],
+    })
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [item['status'] for item in body['deleted']] == ['deleted', 'error', 'not_found']
+    assert body['deleted'][1]['errors'] == ['Neplatné ID předplatného']
+    assert [item['status'] for item in body['updated']] == ['updated', 'error', 'error', 'not_found', 'error']
+    # Chybná položka nebo ID je chyba, ne "nenalezeno"
+    assert body['updated'][1]['errors'] == ['Neplatné ID předplatného']
+    assert body['updated'][2]['errors'] == ['Neplatné ID předplatného']
+    assert body['updated'][4]['id'] == third
+    assert [item['status'] for item in body['created']] == ['created', 'error']
+    assert body['counts'] == {'created': 1, 'updated': 1, 'deleted': 1}
+
+    with app.app_context():
+        prices = {subscription.name: subscription.price for subscription in Subscription.query}
+    assert prices == {'Služba 1': 150, 'Služba 2': 100, 'Netflix': 99}
+
+
+def _snapshot(app):
+    with app.app_context():
+        return [
+            (subscription.id, subscription.name, subscription.price, subscription.billing_cycle,
+             subscription.next_payment, subscription.updated_at)
+            for subscription in Subscription.query.order_by(Subscription.id)
+        ]
+
+
+def test_batch_over_max_items_is_rejected(app, client, add_subscriptions, json_headers):
+    app.config['BATCH_MAX_ITEMS'] = 2
+    add_subscriptions(2)
+    first, second = _ids(app)
+    before = _snapshot(app)
+
+    # Jedno smazání, jedna úprava a jedno vytvoření = 3 položky nad limit 2
+    response = client.post('/api/subscriptions/batch', headers=json_headers, json={
+        'delete': [first],
+        'update': [{'id': second, 'price': 999}],
+        'create': [{'name': 'Netflix', 'price': 1, 'billing_cycle': 'monthly'}],
+    })
+
+    assert response.status_code == 400
+    # Nic se nesmazalo, neupravilo ani nevložilo
+    assert _snapshot(app) == before
+    assert [row[0] for row in before] == [first, second]
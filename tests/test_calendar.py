@@ -0,0 +1,22 @@
+"""Testy streamovaného kalendáře plateb /api/calendar"""
+
+from datetime import date
+
+from models import db, Subscription
+
+
+def test_calendar_streams_occurrences_as_json_array(app, client, add_subscriptions, json_headers):
+    add_subscriptions(2)
+    with app.app_context():
+        db.session.execute(db.update(Subscription).values(next_payment=date(2025, 1, 15)))
+        db.session.commit()
+
+    response = client.get('/api/calendar?from=2025-01-01&to=2025-03-31', headers=json_headers)
+
+    assert response.status_code == 200
+    occurrences = response.get_json()
+    assert [item['date'] for item in occurrences] == [
+        '2025-01-15', '2025-01-15', '2025-02-15', '2025-02-15', '2025-03-15', '2025-03-15'
+    ]
+    assert {item['name'] for item in occurrences} == {'Služba 0', 'Služba 1'}
+    assert occurrences[0]['price'] == 100
@@ -0,0 +1,22 @@
+"""Testy streamovaného exportu (export.py)"""
+
+import app as app_module
+
+
+def test_export_logs_streamed_row_count(app, client, monkeypatch, add_subscriptions):
+    add_subscriptions(3)
+    actions = []
+    monkeypatch.setattr(app_module, 'log_user_action', lambda action, user_id, details: actions.append((action, details)))
+
+    response = client.get('/export?format=ndjson')
+
+    assert len(response.data.splitlines()) == 3
+    # Počet řádků se zaznamená až po dočtení streamu, bez dalšího COUNT dotazu
+    assert actions == [('ndjson_exported', {'record_count': 3})]
+
+
+def test_export_unknown_format_flashes_fixed_message(client):
+    response = client.get('/export?format=xlsx')
+
+    assert response.status_code == 302
+    assert 'xlsx' not in response.headers['Location']
@@ -0,0 +1,19 @@
+"""Testy endpointu /metrics (metrics.py)"""
+
+import pytest
+
+from app import create_app
+
+pytest.importorskip('prometheus_client')
+
+
+def test_metrics_require_token_when_configured(monkeypatch):
+    import config
+    monkeypatch.setattr(config.TestingConfig, 'METRICS_REQUIRE_TOKEN', True)
+    monkeypatch.setattr(config.TestingConfig, 'METRICS_TOKEN', None)
+    assert create_app('testing').test_client().get('/metrics').status_code == 404
+
+    monkeypatch.setattr(config.TestingConfig, 'METRICS_TOKEN', 'secret')
+    client = create_app('testing').test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
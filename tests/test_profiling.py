@@ -0,0 +1,10 @@
+"""Testy nastavení profilování (profiling.py)"""
+
+from profiling import _parse_user_ids
+
+
+def test_invalid_profiler_users_are_skipped(caplog):
+    assert _parse_user_ids('1, admin,,3') == {1, 3}
+    assert 'admin' in caplog.text
+    assert _parse_user_ids([2, 'x']) == {2}
+    assert _parse_user_ids(None) == frozenset()
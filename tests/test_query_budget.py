@@ -0,0 +1,57 @@
+"""Testy rozpočtu dotazů a detekce N+1 (instrumentation.py)"""
+
+from instrumentation import pop_query_budget_violations
+from models import Subscription
+
+
+def test_n_plus_one_is_reported(app, make_client, add_subscriptions):
+    @app.route('/_test/n-plus-one')
+    def n_plus_one():
+        ids = [subscription.id for subscription in Subscription.query.all()]
+        # Záměrné N+1: jeden dotaz na každé předplatné
+        names = [Subscription.query.filter_by(id=subscription_id).first().name for subscription_id in ids]
+        return {'count': len(names)}
+
+    client = make_client()
+    add_subscriptions(app.config['N_PLUS_ONE_THRESHOLD'] + 2)
+
+    response = client.get('/_test/n-plus-one')
+
+    # Odpověď zůstává v pořádku, porušení se jen nahlásí
+    assert response.status_code == 200
+    violations = pop_query_budget_violations(app)
+    assert len(violations) == 1
+    assert 'possible N+1' in violations[0]
+
+
+def test_queries_inside_streamed_response_are_counted(app, client, add_subscriptions, json_headers):
+    add_subscriptions(3)
+    # Před streamem proběhne jen načtení uživatele, dotaz na předplatná běží až v generátoru
+    app.config['QUERY_BUDGET'] = 1
+
+    response = client.get('/api/subscriptions', headers=json_headers)
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+
+    violations = pop_query_budget_violations(app)
+    assert any('/api/subscriptions' in violation and 'budget 1' in violation for violation in violations)
+
+
+def test_request_within_budget_reports_nothing(app, client, add_subscriptions, json_headers):
+    add_subscriptions(3)
+
+    assert client.get('/api/subscriptions', headers=json_headers).status_code == 200
+    assert pop_query_budget_violations(app) == []
+
+
+def test_request_is_logged_without_server_timing(app, client, json_headers, caplog):
+    # Access log gunicornu je vypnutý - řádek subly.request musí vzniknout i bez SERVER_TIMING_ENABLED
+    assert not app.config['SERVER_TIMING_ENABLED']
+    caplog.clear()
+    with caplog.at_level('INFO', logger='subly.request'):
+        response = client.get('/api/subscriptions', headers=json_headers)
+
+    assert 'Server-Timing' not in response.headers
+    records = [record for record in caplog.records if record.name == 'subly.request']
+    assert [record.status for record in records] == [200]
+    assert records[0].endpoint == 'api_subscriptions'
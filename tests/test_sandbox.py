@@ -0,0 +1,72 @@
+"""Testy izolovaného parsování výpisů (sandbox.py)"""
+
+import io
+from urllib.parse import unquote
+
+import pytest
+
+from sandbox import ParseWorkerPool, ParseError, resource
+
+
+def _write_statement(path, rows):
+    with open(path, 'w', encoding='utf-8') as statement:
+        statement.write('Datum,Popis,Částka\n')
+        statement.writelines(f'01.01.2024,Platba kartou Netflix {index},-259\n' for index in range(rows))
+    return str(path)
+
+
+@pytest.mark.skipif(resource is None, reason="RLIMIT_AS je jen na POSIX")
+def test_worker_over_memory_limit_is_replaced(tmp_path):
+    pool = ParseWorkerPool()
+    pool.size, pool.memory_mb, pool.timeout = 1, 64, 20
+    pool._ensure_started()
+    original = pool._workers[0]
+    try:
+        # ~17 MB CSV přes pandas se do 64 MB nad startovní velikost procesu nevejde - podle místa selhání
+        # alokace skončí MemoryError (worker se sám ukončí), nebo pád C kódu pandas signálem
+        with pytest.raises(ParseError):
+            pool.parse(_write_statement(tmp_path / 'big.csv', 400000), 'pandas')
+        original.process.join(5)
+        assert not original.alive
+
+        subscriptions, stats = pool.parse(_write_statement(tmp_path / 'small.csv', 3), 'pandas')
+        assert stats['rows'] == 3
+        assert pool._workers[0] is not original
+    finally:
+        pool.stop()
+
+
+def _upload(client, content):
+    return client.post('/upload', data={'file': (io.BytesIO(content), 'vypis.csv')},
+                       content_type='multipart/form-data')
+
+
+def test_upload_flashes_message_written_for_user(client):
+    response = _upload(client, b'A,B\n1,2\n')
+
+    assert response.status_code == 302
+    assert 'Datum' in unquote(response.headers['Location'])
+
+
+def test_upload_hides_raw_parser_error(client):
+    # Soubor mimo UTF-8 - text chyby z pandas (kodek, pozice bajtu) uživatel neuvidí
+    response = _upload(client, 'Datum,Popis,Částka\n01.01.2024,Předplatné,-259\n'.encode('cp1250'))
+
+    location = unquote(response.headers['Location'])
+    assert 'zkontrolujte prosím jeho formát' in location
+    assert 'codec' not in location
+
+
+@pytest.mark.skipif(resource is None, reason="parsovací procesy jsou jen na POSIX")
+def test_busy_pool_error_has_user_message(tmp_path):
+    pool = ParseWorkerPool()
+    pool.size, pool.timeout = 1, 0.1
+    pool._ensure_started()
+    worker = pool._idle.get()
+    try:
+        with pytest.raises(ParseError) as error:
+            pool.parse(_write_statement(tmp_path / 'small.csv', 3), 'pandas')
+        assert 'obsazené' in error.value.user_message
+    finally:
+        pool._idle.put(worker)
+        pool.stop()
@@ -4,17 +4,23 @@ Obsahuje pomocné funkce pro kategorizaci, validaci, logování a zpracování d
 """
 
 import re
+import csv
 import logging
 from datetime import datetime, timedelta
 from collections import defaultdict
 from functools import wraps
 from flask import request, jsonify, current_app
-import pandas as pd
 
-# Konfigurace logování
-logging.basicConfig(level=logging.INFO)
+from audit import audit_log
+from instrumentation import timed
+from memory import PANDAS_MODE, STREAMING_MODE
+from payments import calculate_next_payments
+
 logger = logging.getLogger(__name__)
 
+class StatementFormatError(ValueError):
+    """Statement rejected with a message written for the user (shown as is, not wrapped)"""
+
 def detect_category(name):
     """Automatically detect category based on service name"""
     if not name:
@@ -77,64 +83,18 @@ def format_service_name(name):
         return ""
     return name.strip().title()
 
+@timed('category_totals')
 def calculate_category_totals(subscriptions):
     """Calculate total costs by category (monthly amounts)"""
-    category_totals = defaultdict(float)
+    category_totals = defaultdict(int)
     
     for subscription in subscriptions:
         if subscription.is_active:
-            monthly_cost = subscription.calculate_monthly_cost()
-            category_totals[subscription.category] += monthly_cost
-    
-    return dict(category_totals)
-
-def _calculate_next_payment_from_date(start_date, billing_cycle):
-    """Calculate next payment date from start date using same logic as Subscription.update_next_payment()"""
-    from datetime import date
-    from dateutil.relativedelta import relativedelta
-    
-    today = date.today()
-    next_payment = None
-    
-    if billing_cycle == "měsíčně":
-        # Najdi nejbližší budoucí měsíční platbu
-        # Vypočítej správné datum v aktuálním měsíci
-        # Pokud je start_date v budoucnosti, použij start_date
-        if start_date > today:
-            next_payment = start_date
-        else:
-            # Najdi první budoucí platbu v aktuálním měsíci
-            import calendar
-            
-            # Zkontroluj, jestli aktuální měsíc má dostatek dní pro start_date.day
-            last_day_of_month = calendar.monthrange(today.year, today.month)[1]
-            
-            if start_date.day <= last_day_of_month:
-                # Měsíc má dostatek dní, použij start_date.day
-                current_month_payment = today.replace(day=start_date.day)
-            else:
-                # Měsíc nemá dostatek dní, použij poslední den měsíce
-                current_month_payment = today.replace(day=last_day_of_month)
-            
-            # Pokud je dnešní den větší než current_month_payment, použij příští měsíc
-            if current_month_payment <= today:
-                next_payment = current_month_payment + relativedelta(months=1)
-            else:
-                next_payment = current_month_payment
-        
-    elif billing_cycle == "ročně":
-        # Najdi nejbližší budoucí roční platbu
-        if start_date > today:
-            # Pokud je start_date v budoucnosti, next_payment je start_date
-            next_payment = start_date
-        else:
-            # Najdi první budoucí roční platbu
-            next_payment = start_date.replace(year=start_date.year + 1)
-            while next_payment < today:
-                next_payment = next_payment.replace(year=next_payment.year + 1)
+            category_totals[subscription.category] += subscription.get_cost_minor()[0]
     
-    return next_payment
+    return {category: total / 100 for category, total in category_totals.items()}
 
+@timed('upcoming')
 def get_upcoming_payments(subscriptions, days=7):
     """Get subscriptions with payments due within specified days"""
     upcoming = []
@@ -154,47 +114,83 @@ def get_upcoming_payments(subscriptions, days=7):
     upcoming.sort(key=lambda x: x['days_until'])
     return upcoming
 
-def process_bank_statement_upload(file_path):
-    """Process uploaded bank statement file and return subscription data"""
+def process_bank_statement_upload(file_path, mode=PANDAS_MODE, stats=None):
+    """
+    Process uploaded bank statement file and return subscription data
+    mode: 'pandas' (DataFrame) nebo 'streaming' (po řádcích, pro soubory nad paměťový rozpočet);
+    do slovníku stats se doplní použitý parser a počet načtených řádků
+    """
+    if stats is None:
+        stats = {}
     try:
         file_extension = file_path.lower().split('.')[-1]
+        stats['parser'] = file_extension
         
         if file_extension == 'csv':
-            return _process_csv_file(file_path)
+            return _process_csv_file(file_path, mode, stats)
         else:
-            raise ValueError(f"Nepodporovaný formát souboru: {file_extension}. Podporujeme pouze CSV.")
+            raise StatementFormatError(f"Nepodporovaný formát souboru: {file_extension}. Podporujeme pouze CSV.")
         
+    except (MemoryError, StatementFormatError):
+        # Paměťový limit parsovacího procesu (RLIMIT_AS) musí proces ukončit a zprávy pro uživatele se nebalí
+        raise
     except Exception as e:
         logger.error(f"Chyba při zpracování souboru: {e}")
         raise ValueError(f"Nepodařilo se zpracovat soubor: {str(e)}")
 
-def _process_csv_file(file_path):
+def _process_csv_file(file_path, mode=PANDAS_MODE, stats=None):
     """Process CSV file and return subscription data"""
     try:
-        df = pd.read_csv(file_path)
-        
-        # Detect CSV format based on available columns
-        is_bank_statement = 'Popis' in df.columns and 'Částka' in df.columns
-        is_subscription_format = 'Název' in df.columns and 'Cena' in df.columns
-        
-        if not is_bank_statement and not is_subscription_format:
-            raise ValueError("Nepodporovaný formát CSV. Očekáváme buď bankovní výpis (sloupce: Datum, Popis, Částka) nebo formát předplatných (sloupce: Název, Cena, Frekvence)")
+        if mode == STREAMING_MODE:
+            # Řádky se čtou postupně, v paměti je vždy jen jeden
+            with open(file_path, newline='', encoding='utf-8-sig') as csv_file:
+                reader = csv.DictReader(csv_file)
+                return _process_csv_rows(reader.fieldnames or [], _count_rows(reader, stats))
         
-        subscriptions = []
+        # pandas se načítá až tady - web worker ani CLI ho při startu nepotřebují
+        import pandas as pd
         
-        if is_bank_statement:
-            # Process bank statement format
-            subscriptions = _process_bank_statement(df)
-        else:
-            # Process subscription format
-            subscriptions = _process_subscription_format(df)
-        
-        return subscriptions
+        df = pd.read_csv(file_path)
+        if stats is not None:
+            stats['rows'] = len(df)
+        return _process_csv_rows(df.columns, (row for _, row in df.iterrows()))
         
+    except (MemoryError, StatementFormatError):
+        raise
     except Exception as e:
         logger.error(f"Chyba při zpracování CSV: {e}")
         raise ValueError(f"Nepodařilo se zpracovat CSV soubor: {str(e)}")
 
+def _count_rows(rows, stats):
+    """Pass rows through, keeping stats['rows'] up to date"""
+    if stats is None:
+        yield from rows
+        return
+    stats['rows'] = 0
+    for row in rows:
+        stats['rows'] += 1
+        yield row
+
+def _as_statement_rows(transactions):
+    """Map parsed XML/ABO transactions to bank statement rows (Datum, Popis, Částka)"""
+    for transaction in transactions:
+        yield {'Datum': transaction['date'], 'Popis': transaction['description'], 'Částka': transaction['amount']}
+
+def _process_csv_rows(columns, rows):
+    """Detect the CSV format from its columns and process the rows (mappings with .get)"""
+    # Detect CSV format based on available columns
+    is_bank_statement = 'Popis' in columns and 'Částka' in columns
+    is_subscription_format = 'Název' in columns and 'Cena' in columns
+    
+    if not is_bank_statement and not is_subscription_format:
+        raise StatementFormatError("Nepodporovaný formát CSV. Očekáváme buď bankovní výpis (sloupce: Datum, Popis, Částka) nebo formát předplatných (sloupce: Název, Cena, Frekvence)")
+    
+    if is_bank_statement:
+        # Process bank statement format
+        return _process_bank_statement(rows)
+    # Process subscription format
+    return _process_subscription_format(rows)
+
 def _process_xml_file(file_path):
     """Process XML bank statement file"""
     try:
@@ -207,7 +203,7 @@ def _process_xml_file(file_path):
         
         # Debug: print XML structure to understand the format
         all_elements = [elem.tag for elem in root.iter()]
-        logger.info(f"XML structure: {all_elements[:20]}...")  # Show first 20 elements
+        logger.debug("XML structure: %s...", all_elements[:20])  # Show first 20 elements
         
         # Try to find transaction elements with various possible names
         transaction_elements = []
@@ -223,12 +219,9 @@ def _process_xml_file(file_path):
         for elem in root.iter():
             if elem.tag in possible_transaction_names:
                 transaction_elements.append(elem)
-                logger.info(f"Found transaction element: {elem.tag} with attributes: {elem.attrib}")
-        
-        logger.info(f"Found {len(transaction_elements)} transaction elements")
+                logger.debug("Found transaction element: %s with attributes: %s", elem.tag, elem.attrib)
         
-        # DEBUG: Check if we're processing all transactions
-        logger.info(f"=== PROCESSING {len(transaction_elements)} TRANSACTIONS ===")
+        logger.info("Found %d transaction elements", len(transaction_elements))
         
         # If no transaction elements found, try to find any element that might contain transaction data
         if not transaction_elements:
@@ -240,7 +233,7 @@ def _process_xml_file(file_path):
                     text_children = [child for child in children if child.text and child.text.strip()]
                     if len(text_children) >= 3:
                         transaction_elements.append(elem)
-                        logger.info(f"Found potential transaction element: {elem.tag} with {len(children)} children")
+                        logger.debug("Found potential transaction element: %s with %d children", elem.tag, len(children))
         
         # If still no transactions found, try a more aggressive approach
         if not transaction_elements:
@@ -260,7 +253,7 @@ def _process_xml_file(file_path):
                             siblings = list(parent)
                             if len(siblings) >= 3:
                                 transaction_elements.append(parent)
-                                logger.info(f"Found potential transaction parent: {parent.tag} with {len(siblings)} children")
+                                logger.debug("Found potential transaction parent: %s with %d children", parent.tag, len(siblings))
                                 break
         
         # Process found transaction elements
@@ -284,14 +277,12 @@ def _process_xml_file(file_path):
                         trn_messages = transaction.findall('.//trn-message')
                         
                         if trn_messages:
-                            # DEBUG: Show ALL trn-message texts for this transaction
-                            logger.info(f"=== ALL TRN-MESSAGES FOR TRANSACTION {transaction.attrib.get('id', 'unknown')} ===")
-                            for i, msg_elem in enumerate(trn_messages):
-                                if msg_elem.text and msg_elem.text.strip():
-                                    logger.info(f"  [{i}] position={msg_elem.attrib.get('position')}, text='{msg_elem.text.strip()}'")
-                                else:
-                                    logger.info(f"  [{i}] position={msg_elem.attrib.get('position')}, text='(empty)'")
-                            logger.info("=== END TRN-MESSAGES ===")
+                            # DEBUG: Show ALL trn-message texts for this transaction (jen se zapnutým DEBUG)
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("Trn-messages for transaction %s: %s", transaction.attrib.get('id', 'unknown'), [
+                                    (msg_elem.attrib.get('position'), (msg_elem.text or '').strip() or '(empty)')
+                                    for msg_elem in trn_messages
+                                ])
                             
                             # Prefer position="2" if available, otherwise take the longest text
                             best_message = None
@@ -300,12 +291,12 @@ def _process_xml_file(file_path):
                                     if msg_elem.attrib.get('position') == '2':
                                         best_message = msg_elem
                                         break
-                                    elif not best_message or len(msg_elem.text.strip()) > len(best_message.text.strip()):
+                                    elif best_message is None or len(msg_elem.text.strip()) > len(best_message.text.strip()):
                                         best_message = msg_elem
                             
-                            if best_message:
+                            if best_message is not None:
                                 desc_text = best_message.text.strip()
-                                logger.info(f"Selected description: {desc_text}")
+                                logger.debug("Selected description: %s", desc_text)
                             else:
                                 logger.warning("No valid trn-message found")
                         else:
@@ -323,11 +314,11 @@ def _process_xml_file(file_path):
                                     'description': desc_text,
                                     'amount': amount_value
                                 })
-                                logger.info(f"Processed MONETA transaction: {desc_text} - {amount_value}")
+                                logger.debug("Processed MONETA transaction: %s - %s", desc_text, amount_value)
                                 
                                 # Debug: Check if this looks like a subscription
                                 if any(service in desc_text.lower() for service in ['netflix', 'spotify', 'apple', 't-mobile']):
-                                    logger.info(f"POTENTIAL SUBSCRIPTION FOUND: {desc_text}")
+                                    logger.debug("Potential subscription found: %s", desc_text)
                                 
                                 continue
                             except ValueError as ve:
@@ -384,7 +375,7 @@ def _process_xml_file(file_path):
                                 'description': desc_text,
                                 'amount': amount_value
                             })
-                            logger.info(f"Processed transaction: {desc_text} - {amount_value}")
+                            logger.debug("Processed transaction: %s - %s", desc_text, amount_value)
                         except ValueError as ve:
                             logger.warning(f"Invalid amount format: {amount_text} - {ve}")
                             continue
@@ -394,8 +385,7 @@ def _process_xml_file(file_path):
                 logger.warning(f"Error processing transaction: {e}")
                 continue
         
-            logger.info(f"Successfully processed {len(transactions)} transactions")
-            logger.info(f"=== FINAL RESULT: {len(transactions)} transactions processed from {len(transaction_elements)} found ===")
+        logger.info("Processed %d transactions from %d found", len(transactions), len(transaction_elements))
         
         if not transactions:
             # Debug: print XML structure to help identify the issue
@@ -403,11 +393,8 @@ def _process_xml_file(file_path):
             logger.error(f"Found {len(transaction_elements)} transaction elements but processed 0 transactions")
             raise ValueError("Nepodařilo se najít transakce v XML souboru")
         
-        # Convert to DataFrame and process like bank statement
-        df = pd.DataFrame(transactions)
-        df.columns = ['Datum', 'Popis', 'Částka']  # Standardize column names
-        
-        return _process_bank_statement(df)
+        # Process like bank statement (standardized column names)
+        return _process_bank_statement(_as_statement_rows(transactions))
         
     except Exception as e:
         logger.error(f"Chyba při zpracování XML: {e}")
@@ -462,11 +449,8 @@ def _process_abo_file(file_path):
         if not transactions:
             raise ValueError("Nepodařilo se najít transakce v ABO souboru")
         
-        # Convert to DataFrame and process like bank statement
-        df = pd.DataFrame(transactions)
-        df.columns = ['Datum', 'Popis', 'Částka']  # Standardize column names
-        
-        return _process_bank_statement(df)
+        # Process like bank statement (standardized column names)
+        return _process_bank_statement(_as_statement_rows(transactions))
         
     except Exception as e:
         logger.error(f"Chyba při zpracování ABO souboru: {e}")
@@ -475,6 +459,8 @@ def _process_abo_file(file_path):
 def _process_txt_file(file_path):
     """Process TXT bank statement file"""
     try:
+        import pandas as pd
+        
         # Try to read as CSV first
         try:
             df = pd.read_csv(file_path, sep='\t')  # Tab-separated
@@ -485,10 +471,11 @@ def _process_txt_file(file_path):
                 df = pd.read_csv(file_path, sep=',')  # Comma-separated
         
         # Check if it looks like a bank statement
+        rows = (row for _, row in df.iterrows())
         if 'Popis' in df.columns and 'Částka' in df.columns:
-            return _process_bank_statement(df)
+            return _process_bank_statement(rows)
         elif 'Název' in df.columns and 'Cena' in df.columns:
-            return _process_subscription_format(df)
+            return _process_subscription_format(rows)
         else:
             raise ValueError("Nepodporovaný formát TXT souboru")
         
@@ -496,14 +483,14 @@ def _process_txt_file(file_path):
         logger.error(f"Chyba při zpracování TXT souboru: {e}")
         raise ValueError(f"Nepodařilo se zpracovat TXT soubor: {str(e)}")
 
-def _process_bank_statement(df):
-    """Process bank statement CSV format"""
+def _process_bank_statement(rows):
+    """Process bank statement CSV format (rows: DataFrame rows or csv.DictReader dicts)"""
     subscriptions = []
     
     # Group transactions by service name to detect recurring payments
     service_groups = {}
     
-    for _, row in df.iterrows():
+    for row in rows:
         try:
             description = str(row.get('Popis', '')).strip()
             amount = float(row.get('Částka', 0))
@@ -567,11 +554,8 @@ def _process_bank_statement(df):
         if len(transactions) == 1 and is_known_service:
             billing_cycle = "měsíčně"
         
-        # Calculate next payment using start_date (first transaction), not latest_date
-        next_payment = None
+        # Next payment is calculated from start_date (first transaction), not latest_date
         start_date = transactions[0]['date'] if transactions else None
-        if start_date and billing_cycle:
-            next_payment = _calculate_next_payment_from_date(start_date, billing_cycle)
         
         subscriptions.append({
             'name': service_name,
@@ -579,17 +563,27 @@ def _process_bank_statement(df):
             'billing_cycle': billing_cycle or 'měsíčně',
             'category': detect_category(service_name),
             'start_date': start_date,
-            'next_payment': next_payment,
+            'next_payment': None,
             'notes': f"Importováno z bankovního výpisu - {service_name}"
         })
     
+    _fill_next_payments(subscriptions)
     return subscriptions
 
-def _process_subscription_format(df):
-    """Process subscription CSV format"""
+def _fill_next_payments(subscriptions):
+    """Calculate next_payment for all imported subscriptions in one batch"""
+    next_payments = calculate_next_payments(
+        [sub['start_date'] for sub in subscriptions],
+        [sub['billing_cycle'] for sub in subscriptions]
+    )
+    for sub, next_payment in zip(subscriptions, next_payments):
+        sub['next_payment'] = next_payment
+
+def _process_subscription_format(rows):
+    """Process subscription CSV format (rows: DataFrame rows or csv.DictReader dicts)"""
     subscriptions = []
     
-    for _, row in df.iterrows():
+    for row in rows:
         try:
             name = format_service_name(row.get('Název', ''))
             if not name:
@@ -612,23 +606,18 @@ def _process_subscription_format(df):
                 try:
                     if isinstance(start_date, str):
                         parsed_start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-                    elif isinstance(start_date, pd.Timestamp):
+                    elif isinstance(start_date, datetime):  # pd.Timestamp
                         parsed_start_date = start_date.date()
                 except (ValueError, TypeError):
                     pass
             
-            # Calculate next payment using proper logic
-            next_payment = None
-            if parsed_start_date:
-                next_payment = _calculate_next_payment_from_date(parsed_start_date, billing_cycle)
-            
             subscriptions.append({
                 'name': name,
                 'price': price,
                 'billing_cycle': billing_cycle,
                 'category': category,
                 'start_date': parsed_start_date,
-                'next_payment': next_payment,
+                'next_payment': None,
                 'notes': f"Importováno z CSV - {name}"
             })
             
@@ -636,6 +625,7 @@ def _process_subscription_format(df):
             logger.warning(f"Chyba při zpracování řádku: {e}")
             continue
     
+    _fill_next_payments(subscriptions)
     return subscriptions
 
 def _extract_service_name_from_description(description):
@@ -668,7 +658,7 @@ def _extract_service_name_from_description(description):
     if not any(service in description_lower for service in known_subscription_services):
         # Debug: Log transactions that might be subscriptions but aren't in whitelist
         if any(keyword in description_lower for keyword in ['netflix', 'spotify', 'apple', 't-mobile', 'hbo', 'amazon']):
-            logger.info(f"SKIPPED POTENTIAL SUBSCRIPTION: {description} (not in whitelist)")
+            logger.debug("Skipped potential subscription: %s (not in whitelist)", description)
         return None
     
     # Skip generic transaction descriptions that are not subscriptions
@@ -808,6 +798,20 @@ def _extract_service_name_from_description(description):
     
     return None
 
+# Ukázkové popisy transakcí pro warm_up_parsers - projdou whitelistem i regulárními výrazy
+_WARM_UP_DESCRIPTIONS = (
+    'Netflix - měsíční předplatné',
+    'Spotify Premium Family',
+    'Nákup Lidl platba kartou',
+    'GOPAY *GOOGLE.COM',
+    'Apple.com/bill',
+)
+
+def warm_up_parsers():
+    """Run the statement parsing helpers once so that their regular expressions are compiled and cached"""
+    for description in _WARM_UP_DESCRIPTIONS:
+        detect_category(_extract_service_name_from_description(description))
+
 def _detect_billing_cycle(transactions):
     """Detect billing cycle based on transaction dates"""
     if len(transactions) < 2:
@@ -863,7 +867,7 @@ def handle_errors(f):
     return decorated_function
 
 def log_user_action(action, user_id=None, details=None):
-    """Log user actions for audit trail"""
+    """Record user action to the audit trail (queued, written in the background)"""
     try:
         from flask import request
         ip_address = request.remote_addr if request else None
@@ -873,15 +877,8 @@ def log_user_action(action, user_id=None, details=None):
         ip_address = None
         user_agent = None
     
-    log_data = {
-        'action': action,
-        'user_id': user_id,
-        'timestamp': datetime.utcnow().isoformat(),
-        'ip_address': ip_address,
-        'user_agent': user_agent,
-        'details': details
-    }
-    logger.info(f"User action: {log_data}")
+    audit_log.record(action, user_id=user_id, ip_address=ip_address, user_agent=user_agent, details=details)
+    logger.debug("User action: %s user_id=%s", action, user_id)
 
 def validate_file_upload(file):
     """Validate uploaded file"""
@@ -906,24 +903,6 @@ def validate_file_upload(file):
     
     return True
 
-def generate_export_data(subscriptions):
-    """Generate data for CSV export"""
-    export_data = []
-    
-    for subscription in subscriptions:
-        export_data.append({
-            'Název': subscription.name,
-            'Cena': subscription.price,
-            'Frekvence': subscription.billing_cycle,
-            'Kategorie': subscription.category,
-            'Začátek': subscription.start_date.strftime('%Y-%m-%d') if subscription.start_date else '',
-            'Další platba': subscription.next_payment.strftime('%Y-%m-%d') if subscription.next_payment else '',
-            'Poznámky': subscription.notes or '',
-            'Aktivní': 'Ano' if subscription.is_active else 'Ne'
-        })
-    
-    return export_data
-
 def get_service_letter(service_name):
     """Get first letter of service name for icon display"""
     if not service_name or not service_name.strip():
@@ -952,6 +931,7 @@ def get_category_letter(category):
     
     return first_letter
 
+@timed('statistics')
 def get_statistics(subscriptions):
     """Calculate application statistics"""
     if not subscriptions:
@@ -965,9 +945,10 @@ def get_statistics(subscriptions):
         }
     
     active_subscriptions = [s for s in subscriptions if s.is_active]
+    costs = [s.get_cost_minor() for s in active_subscriptions]
     
-    monthly_total = sum(s.calculate_monthly_cost() for s in active_subscriptions)
-    yearly_total = sum(s.calculate_yearly_cost() for s in active_subscriptions)
+    monthly_total = sum(monthly for monthly, _ in costs)
+    yearly_total = sum(yearly for _, yearly in costs)
     
     categories = calculate_category_totals(active_subscriptions)
     upcoming_payments = len(get_upcoming_payments(active_subscriptions))
@@ -975,28 +956,89 @@ def get_statistics(subscriptions):
     return {
         'total_subscriptions': len(subscriptions),
         'active_subscriptions': len(active_subscriptions),
-        'monthly_total': round(monthly_total, 2),
-        'yearly_total': round(yearly_total, 2),
+        'monthly_total': monthly_total / 100,
+        'yearly_total': yearly_total / 100,
         'categories': categories,
         'upcoming_payments': upcoming_payments
     }
 
-def update_all_next_payments():
-    """Update next payment dates for all subscriptions"""
+def get_subscription_names(user_id):
+    """Return set of subscription names of the user (index-only scan over (user_id, name))"""
     from models import Subscription, db
-    subscriptions = Subscription.query.all()
-    updated_count = 0
+    return {name for (name,) in db.session.query(Subscription.name).filter(Subscription.user_id == user_id)}
+
+def record_tombstones(user_id, subscription_ids):
+    """Write deletion log entries so delta-sync clients learn about deleted subscriptions"""
+    from models import SubscriptionTombstone, db
     
-    for subscription in subscriptions:
-        if subscription.start_date:
-            old_next_payment = subscription.next_payment
-            subscription.update_next_payment()
-            if subscription.next_payment != old_next_payment:
-                updated_count += 1
-                logger.info(f"Updated next payment for {subscription.name}: {old_next_payment} -> {subscription.next_payment}")
-    
-    if updated_count > 0:
-        db.session.commit()
-        logger.info(f"Updated {updated_count} subscription next payment dates")
-    
-    return updated_count
+    if not subscription_ids:
+        return
+    deleted_at = datetime.utcnow()
+    db.session.execute(db.insert(SubscriptionTombstone), [
+        {'user_id': user_id, 'subscription_id': sub_id, 'deleted_at': deleted_at}
+        for sub_id in subscription_ids
+    ])
+
+def delete_user_subscriptions(user_id, ids, chunk_size=500):
+    """
+    Delete user's subscriptions by id with set-based DELETE ... RETURNING statements
+    Returns list of actually deleted ids (foreign or missing ids are ignored)
+    """
+    from models import Subscription, db
+    
+    ids = sorted({int(sub_id) for sub_id in ids})
+    supports_returning = db.engine.dialect.delete_returning
+    deleted_ids = []
+    
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        condition = (Subscription.user_id == user_id) & Subscription.id.in_(chunk)
+        
+        if supports_returning:
+            result = db.session.execute(
+                db.delete(Subscription).where(condition).returning(Subscription.id),
+                execution_options={'synchronize_session': False}
+            )
+            deleted_ids.extend(result.scalars())
+        else:
+            chunk_ids = db.session.execute(db.select(Subscription.id).where(condition)).scalars().all()
+            db.session.execute(
+                db.delete(Subscription).where(Subscription.id.in_(chunk_ids)),
+                execution_options={'synchronize_session': False}
+            )
+            deleted_ids.extend(chunk_ids)
+    
+    record_tombstones(user_id, deleted_ids)
+    return deleted_ids
+
+@timed('statistics')
+def get_user_statistics(user_id, days=7):
+    """Calculate the same statistics as get_statistics with SQL aggregates (no ORM rows loaded)"""
+    from models import Subscription, db
+    
+    today = datetime.now().date()
+    active = Subscription.is_active.is_(True)
+    
+    total, active_count, upcoming = db.session.query(
+        db.func.count(Subscription.id),
+        db.func.count(Subscription.id).filter(active),
+        db.func.count(Subscription.id).filter(
+            active,
+            Subscription.next_payment.between(today, today + timedelta(days=days))
+        )
+    ).filter(Subscription.user_id == user_id).one()
+    
+    category_rows = db.session.query(
+        Subscription.category,
+        db.func.sum(Subscription.monthly_cost_minor),
+        db.func.sum(Subscription.yearly_cost_minor)
+    ).filter(Subscription.user_id == user_id, active).group_by(Subscription.category).all()
+    
+    return {
+        'total_subscriptions': total,
+        'active_subscriptions': active_count,
+        'monthly_total': sum(monthly or 0 for _, monthly, _ in category_rows) / 100,
+        'yearly_total': sum(yearly or 0 for _, _, yearly in category_rows) / 100,
+        'categories': {category: (monthly or 0) / 100 for category, monthly, _ in category_rows},
+        'upcoming_payments': upcoming
+    }